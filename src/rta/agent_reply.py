@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import re
+import sys
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar
 
-from pydantic import BaseModel, Field, ValidationError
+import orjson
+from pydantic import BaseModel, Field
 
+try:
+    import json_repair
+    HAS_JSON_REPAIR = True
+except ImportError:
+    HAS_JSON_REPAIR = False
+
+from .config import DEFAULT_CONFIG
+from .llm.cache import cache_key, fill_skeleton, json_skeleton
 from .llm.gemini_client import GeminiClient
 from .logger import EventLogger
 from .schemas import InputPayload, QueryPlan
 
 
+T = TypeVar("T")
+
+
 class AgentReply(BaseModel):
     topic_summary: str = Field(..., description="1 short paragraph in English.")
     key_terms: list[dict[str, str]] = Field(
@@ -25,6 +38,10 @@ class AgentReply(BaseModel):
     )
 
 
+# Compiled pydantic-core validator, shared by every parse attempt.
+_AGENT_REPLY_VALIDATOR = AgentReply.__pydantic_validator__
+
+
 _SYSTEM = """You are a research thinking agent.
 Given a topic and (optionally) a query plan, produce a helpful user-facing response.
 
@@ -42,28 +59,59 @@ _SCHEMA_HINT = """{
 }"""
 
 
+_FENCE_HEAD = re.compile(r"^```[a-zA-Z0-9_-]*\s*")
+_FENCE_TAIL = re.compile(r"\s*```$")
+
+
 def _extract_json_block(text: str) -> str:
     """
     Extract the first {...} block if the model accidentally adds extra text.
     """
     t = text.strip()
 
+    # Fast path: JSON mime-type responses are usually a bare object
+    if t.startswith("{") and t.endswith("}"):
+        return t
+
     # Remove common markdown fences if any
     if t.startswith("```"):
-        t = re.sub(r"^```[a-zA-Z0-9_-]*\s*", "", t)
-        t = re.sub(r"\s*```$", "", t)
-
-    # Find first JSON object block
-    m = re.search(r"\{.*\}", t, flags=re.DOTALL)
-    if m:
-        return m.group(0).strip()
+        t = _FENCE_HEAD.sub("", t)
+        t = _FENCE_TAIL.sub("", t)
+
+    # Outermost {...} span (same span the greedy DOTALL regex used to match)
+    start = t.find("{")
+    end = t.rfind("}")
+    if start != -1 and end > start:
+        return t[start:end + 1].strip()
     return t
 
 
-def _repair_json_via_llm(
+async def _first_success(aws: List[Awaitable[T]]) -> T:
+    """
+    Run awaitables concurrently; return the first successful result and cancel
+    the rest. Re-raises the last error if every awaitable fails.
+    """
+    pending = {asyncio.ensure_future(a) for a in aws}
+    last_err: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_err = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    assert last_err is not None
+    raise last_err
+
+
+async def _repair_json_via_llm(
     client: GeminiClient,
     logger: EventLogger,
     broken_json_text: str,
+    temperature: float = 0.0,
 ) -> Tuple[str, Dict[str, Any]]:
     """
     Ask Gemini to repair broken JSON into valid JSON.
@@ -78,25 +126,125 @@ All strings must be in English."""
         "schema_hint": _SCHEMA_HINT,
     }
 
-    repaired_text, meta = client.generate_json(
+    repaired_text, meta = await client.agenerate_json(
         logger=logger,
         stage="reply_repair",
         system=system,
-        user=json.dumps(user_payload, ensure_ascii=False),
+        user=orjson.dumps(user_payload).decode("utf-8"),
         schema_hint=_SCHEMA_HINT,
-        temperature=0.0,
+        temperature=temperature,
         max_output_tokens=2000,
     )
     return repaired_text, meta
 
 
-def build_agent_reply(
+def _repair_json_locally(logger: EventLogger, broken_json_text: str) -> Optional[AgentReply]:
+    """
+    Fix the usual LLM JSON slips (trailing commas, unclosed brackets/strings)
+    offline with json_repair before paying for an LLM round-trip.
+    """
+    if not HAS_JSON_REPAIR:
+        return None
+    # we already know the text does not parse, so skip json_repair's own check
+    repaired = json_repair.repair_json(broken_json_text, skip_json_loads=True)
+    if not isinstance(repaired, str) or not repaired:
+        return None
+    try:
+        reply = _AGENT_REPLY_VALIDATOR.validate_json(repaired.encode("utf-8"))
+    except ValueError:
+        logger.log("reply", "json_repair_local_failed", {})
+        return None
+    logger.log("reply", "json_repair_local_ok", {})
+    return reply
+
+
+def _repair_template_key(skeleton: str) -> str:
+    return cache_key(kind="reply_repair_template", skeleton=skeleton)
+
+
+def _repair_via_template(
+    client: GeminiClient,
+    logger: EventLogger,
+    broken_json_text: str,
+) -> Optional[AgentReply]:
+    """
+    Structural repair cache: if a same-shaped payload was repaired before,
+    splice this payload's literals into that repaired skeleton and verify it.
+    """
+    if client.cache is None:
+        return None
+    skeleton, literals = json_skeleton(broken_json_text)
+    hit = client.cache.get(_repair_template_key(skeleton))
+    if hit is None:
+        return None
+    repaired = fill_skeleton(hit[0], literals)
+    if repaired is not None:
+        try:
+            reply = _AGENT_REPLY_VALIDATOR.validate_json(repaired.encode("utf-8"))
+            logger.log("reply", "json_repair_template_hit", {"literals": len(literals)})
+            return reply
+        except ValueError:
+            pass
+    logger.log("reply", "json_repair_template_rejected", {"literals": len(literals)})
+    return None
+
+
+def _remember_repair_template(client: GeminiClient, broken_json_text: str, repaired_json_text: str) -> None:
+    """
+    Only repairs that kept every literal (pure structural fixes) are reusable.
+    """
+    if client.cache is None:
+        return
+    broken_skeleton, broken_literals = json_skeleton(broken_json_text)
+    repaired_skeleton, repaired_literals = json_skeleton(repaired_json_text)
+    if broken_literals == repaired_literals:
+        client.cache.set(_repair_template_key(broken_skeleton), repaired_skeleton, {"kind": "repair_template"})
+
+
+async def _repair_and_validate(
+    client: GeminiClient,
+    logger: EventLogger,
+    candidate: str,
+    attempt: int,
+    temperature: float,
+) -> AgentReply:
+    repaired_text, rmeta = await _repair_json_via_llm(client, logger, candidate, temperature)
+    repaired_candidate = _extract_json_block(repaired_text)
+
+    if logger.debug:
+        logger.log(
+            "reply",
+            "json_repair_preview",
+            {"attempt": attempt, "preview": repaired_candidate[:200], "model": rmeta.get("model")},
+        )
+
+    try:
+        reply = _AGENT_REPLY_VALIDATOR.validate_json(repaired_candidate.encode("utf-8"))
+    except ValueError as e:
+        logger.log("reply", "json_parse_failed", {
+            "attempt": attempt,
+            "reason": str(e),
+            "preview": repaired_candidate[:200],
+            "model": rmeta.get("model"),
+        })
+        raise
+    _remember_repair_template(client, candidate, repaired_candidate)
+    return reply
+
+
+async def build_agent_reply(
     user_input: InputPayload,
     logger: EventLogger,
     query_plan: Optional[QueryPlan],
     run_dir: Path,
+    timeout_s: Optional[float] = None,
+    client: Optional[GeminiClient] = None,
 ) -> AgentReply:
-    client = GeminiClient.from_env()
+    # `logger` belongs to the caller, who closes it (interactive: `with logger:`)
+    if client is None:
+        client = GeminiClient.get_shared()
+    if timeout_s is None:
+        timeout_s = DEFAULT_CONFIG.request_timeout_s
 
     # IMPORTANT: keep reply compact to avoid truncation
     payload: Dict[str, Any] = {
@@ -112,92 +260,123 @@ def build_agent_reply(
         },
     }
 
-    raw_text, meta = client.generate_json(
+    request: Dict[str, Any] = dict(
         logger=logger,
         stage="reply",
         system=_SYSTEM,
-        user=json.dumps(payload, ensure_ascii=False),
+        user=orjson.dumps(payload).decode("utf-8"),
         schema_hint=_SCHEMA_HINT,
         temperature=0.2,
         max_output_tokens=2000,  # key fix: avoid truncation
     )
 
-    logger.log(
-        "reply",
-        "raw_preview",
-        {
-            "preview": raw_text[:240],
-            "model": meta.get("model"),
-            "latency_ms": meta.get("latency_ms"),
-        },
-    )
+    # Streamed: the reply is validated as soon as the buffered JSON closes.
+    streamed: List[AgentReply] = []
 
-    # ---- Attempt 1: parse directly (with extraction) ----
-    candidate = _extract_json_block(raw_text)
+    def _accept(buf: bytes) -> bool:
+        try:
+            streamed.append(_AGENT_REPLY_VALIDATOR.validate_json(buf))
+            return True
+        except ValueError:
+            return False
+
+    request["accept"] = _accept
+
+    # Stalled calls are cancelled and hedged with two parallel retries.
     try:
-        obj = json.loads(candidate)
-    except Exception as e:
-        logger.log("reply", "json_parse_failed", {"attempt": 1, "reason": str(e)})
-
-        # ---- Attempt 2-3: repair up to 2 times ----
-        last_err: Optional[Exception] = None
-        repaired_candidate = candidate
-
-        for attempt in (2, 3):
-            repaired_text, rmeta = _repair_json_via_llm(client, logger, repaired_candidate)
-            repaired_candidate = _extract_json_block(repaired_text)
-
-            logger.log(
-                "reply",
-                "json_repair_preview",
-                {"attempt": attempt, "preview": repaired_candidate[:200], "model": rmeta.get("model")},
-            )
-
-            try:
-                obj = json.loads(repaired_candidate)
-                last_err = None
-                break
-            except Exception as e2:
-                last_err = e2
-                logger.log("reply", "json_parse_failed", {"attempt": attempt, "reason": str(e2)})
-
-        if last_err is not None:
-            logger.log("reply", "schema_validated", {"ok": False, "reason": f"json_parse_error_after_repairs: {last_err}"})
-            raise RuntimeError(f"Reply JSON parse failed after repairs: {last_err}")
-
-    # ---- Pydantic validation ----
+        raw_text, meta = await asyncio.wait_for(client.agenerate_json_stream(**request), timeout=timeout_s)
+    except asyncio.TimeoutError:
+        logger.log("reply", "llm_timeout", {"timeout_s": timeout_s, "hedged_calls": 2})
+        raw_text, meta = await _first_success([client.agenerate_json_stream(**request) for _ in range(2)])
+
+    def _log_raw_preview() -> None:
+        logger.log(
+            "reply",
+            "raw_preview",
+            {
+                "preview": raw_text[:240],
+                "model": meta.get("model"),
+                "latency_ms": meta.get("latency_ms"),
+            },
+        )
+
+    # Previews are diagnostics: always in debug mode, otherwise only on failure.
+    if logger.debug:
+        _log_raw_preview()
+
+    if streamed:
+        logger.log("reply", "schema_validated", {"ok": True, "streamed": True})
+        return streamed[-1]
+
+    # ---- Attempt 1: parse + validate directly ----
+    # validate_json parses and validates in a single pass (no dict).
+    # response_mime_type="application/json" makes the raw text a bare object
+    # almost always; _extract_json_block is only a legacy fallback.
+    candidate = raw_text
     try:
-        reply = AgentReply.model_validate(obj)
+        reply = _AGENT_REPLY_VALIDATOR.validate_json(raw_text.encode("utf-8"))
+        logger.log("reply", "schema_validated", {"ok": True})
+        return reply
+    except ValueError:  # pydantic's ValidationError is a ValueError
+        candidate = _extract_json_block(raw_text)
+        try:
+            reply = _AGENT_REPLY_VALIDATOR.validate_json(candidate.encode("utf-8"))
+            logger.log("reply", "schema_validated", {"ok": True, "extracted": True})
+            return reply
+        except ValueError as e:
+            if not logger.debug:
+                _log_raw_preview()
+            logger.log("reply", "json_parse_failed", {"attempt": 1, "reason": str(e)})
+
+    # ---- Cheap offline repairs first: local fixer, then known repair shapes ----
+    # json_repair gets the raw text: on truncated output the extracted block is
+    # cut at an inner "}" and would lose the tail that json_repair can close.
+    reply = _repair_json_locally(logger, raw_text) or _repair_via_template(client, logger, candidate)
+    if reply is not None:
         logger.log("reply", "schema_validated", {"ok": True})
         return reply
-    except ValidationError as e:
-        logger.log("reply", "schema_validated", {"ok": False, "reason": "pydantic_validation_error"})
-        raise RuntimeError(f"Reply schema validation failed: {e}")
 
+    # ---- Attempt 2-3: two repairs in flight at once, first valid one wins ----
+    # Repair is idempotent; the second attempt runs slightly warmer so the two
+    # calls are not identical requests.
+    try:
+        reply = await _first_success([
+            _repair_and_validate(client, logger, candidate, attempt=2, temperature=0.0),
+            _repair_and_validate(client, logger, candidate, attempt=3, temperature=0.2),
+        ])
+    except (ValueError, RuntimeError) as last_err:
+        logger.log("reply", "schema_validated", {"ok": False, "reason": f"json_error_after_repairs: {last_err}"})
+        raise RuntimeError(f"Reply JSON parse/validation failed after repairs: {last_err}")
 
-def print_agent_reply(reply: AgentReply, run_dir: Path) -> None:
-    print("\nRTA: Topic summary")
-    print(f"{reply.topic_summary}\n")
+    logger.log("reply", "schema_validated", {"ok": True})
+    return reply
 
-    print("RTA: Key terms (glossary)")
+
+def print_agent_reply(reply: AgentReply, run_dir: Path) -> None:
+    glossary = []
     for item in reply.key_terms:
         term = (item.get("term") or "").strip()
         definition = (item.get("definition") or "").strip()
         if term and definition:
-            print(f"  - {term}: {definition}")
-    print("")
-
-    print("RTA: Suggested research directions")
-    for i, d in enumerate(reply.suggested_directions, 1):
-        print(f"  {i}. {d}")
-    print("")
-
-    print("RTA: Suggested search queries")
-    for q in reply.suggested_search_queries:
-        print(f"  - {q}")
-    print("")
-
-    print("RTA: Saved outputs")
-    print(f"  - {run_dir}")
-    print(f"  - {run_dir / 'query_plan.json'}")
-    print("")
+            glossary.append(f"  - {term}: {definition}\n")
+
+    # Assemble the whole reply, then emit it with a single write + flush
+    out = "".join([
+        "\nRTA: Topic summary\n",
+        f"{reply.topic_summary}\n\n",
+        "RTA: Key terms (glossary)\n",
+        *glossary,
+        "\n",
+        "RTA: Suggested research directions\n",
+        *(f"  {i}. {d}\n" for i, d in enumerate(reply.suggested_directions, 1)),
+        "\n",
+        "RTA: Suggested search queries\n",
+        *(f"  - {q}\n" for q in reply.suggested_search_queries),
+        "\n",
+        "RTA: Saved outputs\n",
+        f"  - {run_dir}\n",
+        f"  - {run_dir / 'query_plan.json'}\n",
+        "\n",
+    ])
+    sys.stdout.write(out)
+    sys.stdout.flush()
@@ -21,17 +21,19 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 import typer
 
-from .config import RTAConfig
-from .shell import RTAShell
-
 app = typer.Typer(add_completion=False)
 
 @app.command()
 def main() -> None:
     """Launch RTA interactive shell."""
+    # Heavy imports (pydantic, prompt_toolkit, pipeline tree) stay out of
+    # module import so `rta --help` does not pay for them.
+    from .config import DEFAULT_CONFIG
+    from .shell import RTAShell
+
     try:
         # Initialize and run the shell
-        RTAShell(RTAConfig()).run()
+        RTAShell(DEFAULT_CONFIG).run()
     except KeyboardInterrupt:
         sys.exit(0)
     except Exception as e:
@@ -1,8 +1,28 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, Field
+import functools
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field
 import os
 
+_ENV_LOADED = False
+
+
+def load_env() -> None:
+    """
+    Load .env into os.environ once per process (never overriding real env vars).
+    """
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return
+    _ENV_LOADED = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv(override=False)
+
 
 class RTAConfig(BaseModel):
     """
@@ -11,7 +31,10 @@ class RTAConfig(BaseModel):
     Notes:
     - Keep config serializable (JSON) for run reproducibility.
     - Add fields incrementally as phases progress.
+    - Frozen: derive session overrides with model_copy(update=...).
     """
+    model_config = ConfigDict(frozen=True)
+
     runs_dir: str = Field(default_factory=lambda: os.getenv("RTA_RUNS_DIR", "runs"))
 
     # retrieval
@@ -20,8 +43,25 @@ class RTAConfig(BaseModel):
     min_year: int = Field(default_factory=lambda: int(os.getenv("RTA_MIN_YEAR", "2020")))
     max_year: int = Field(default_factory=lambda: int(os.getenv("RTA_MAX_YEAR", "2026")))
     cache_ttl_hours: int = Field(default_factory=lambda: int(os.getenv("RTA_CACHE_TTL_HOURS", "24")))
+    # validate_default: the value comes from the environment, not the code
+    sources: Literal["both", "arxiv", "s2"] = Field(
+        default_factory=lambda: os.getenv("RTA_SOURCES", "both").lower(), validate_default=True
+    )
+
+    # llm
+    request_timeout_s: float = Field(default_factory=lambda: float(os.getenv("RTA_REQUEST_TIMEOUT_S", "30")))
 
     debug_store_llm_raw: bool = False  # store raw prompt/response cautiously
 
 
-DEFAULT_CONFIG = RTAConfig()
+@functools.cache
+def get_config() -> RTAConfig:
+    """
+    Process-wide config from .env + environment (built once; the fields'
+    default factories read the env vars).
+    """
+    load_env()
+    return RTAConfig()
+
+
+DEFAULT_CONFIG = get_config()
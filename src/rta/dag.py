@@ -0,0 +1,137 @@
+"""
+Stage DAG Executor.
+File: src/rta/dag.py
+
+Runs pipeline tasks in dependency order (Kahn's algorithm). Every task whose
+dependencies have finished is submitted to a thread pool right away, so
+independent tasks (e.g. writing one stage's artifacts while the next stage
+is already talking to the LLM) overlap instead of running back to back.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class StageTask:
+    """One node of the pipeline graph. fn receives the shared results dict."""
+    name: str
+    fn: Callable[[Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+
+
+async def _acall(fn: Callable[[Dict[str, Any]], Any], results: Dict[str, Any]) -> Any:
+    """Await coroutine tasks on the loop; push blocking tasks to a worker thread."""
+    if inspect.iscoroutinefunction(fn):
+        return await fn(results)
+    return await asyncio.to_thread(fn, results)
+
+
+class DAGPipeline:
+    """
+    Dependency-ordered task runner (run() on a thread pool, arun() on asyncio).
+
+    Discipline:
+    - a task's return value is stored in results[task.name]
+    - a task only reads results of its own deps (already complete when it starts)
+    - the first failure stops scheduling; running tasks are drained, then it is re-raised
+    """
+
+    def __init__(self, tasks: Sequence[StageTask], max_workers: int = 4):
+        self.tasks: Dict[str, StageTask] = {t.name: t for t in tasks}
+        if len(self.tasks) != len(tasks):
+            raise ValueError("Duplicate task names in stage graph")
+        for t in tasks:
+            for dep in t.deps:
+                if dep not in self.tasks:
+                    raise ValueError(f"Task {t.name!r} depends on unknown task {dep!r}")
+        self.max_workers = max_workers
+
+    def _graph(self) -> Tuple[Dict[str, int], Dict[str, List[str]], List[str]]:
+        indegree = {name: len(t.deps) for name, t in self.tasks.items()}
+        dependents: Dict[str, List[str]] = {name: [] for name in self.tasks}
+        for t in self.tasks.values():
+            for dep in t.deps:
+                dependents[dep].append(t.name)
+        ready = [name for name, n in indegree.items() if n == 0]
+        return indegree, dependents, ready
+
+    def run(self, results: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        results = {} if results is None else results
+        indegree, dependents, ready = self._graph()
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+        completed = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while ready or running:
+                if error is None:
+                    for name in ready:
+                        running[pool.submit(self.tasks[name].fn, results)] = name
+                ready = []
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    try:
+                        # results is only written here, on the scheduling thread
+                        results[name] = fut.result()
+                    except BaseException as e:
+                        if error is None:
+                            error = e
+                        continue
+                    completed += 1
+                    for child in dependents[name]:
+                        indegree[child] -= 1
+                        if indegree[child] == 0:
+                            ready.append(child)
+
+        if error is not None:
+            raise error
+        if completed != len(self.tasks):
+            raise ValueError("Stage graph has a cycle")
+        return results
+
+    async def arun(self, results: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Same contract as run(), but coroutine tasks share one event loop."""
+        results = {} if results is None else results
+        indegree, dependents, ready = self._graph()
+        running: Dict[asyncio.Future, str] = {}
+        error: Optional[BaseException] = None
+        completed = 0
+
+        while ready or running:
+            if error is None:
+                for name in ready:
+                    running[asyncio.ensure_future(_acall(self.tasks[name].fn, results))] = name
+            ready = []
+            if not running:
+                break
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for fut in finished:
+                name = running.pop(fut)
+                try:
+                    results[name] = fut.result()
+                except BaseException as e:
+                    if error is None:
+                        error = e
+                    continue
+                completed += 1
+                for child in dependents[name]:
+                    indegree[child] -= 1
+                    if indegree[child] == 0:
+                        ready.append(child)
+
+        if error is not None:
+            raise error
+        if completed != len(self.tasks):
+            raise ValueError("Stage graph has a cycle")
+        return results
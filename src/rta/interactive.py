@@ -1,23 +1,30 @@
 from __future__ import annotations
 
-import json
+import asyncio
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 import typer
 
 from .config import DEFAULT_CONFIG
-from .pipeline import run_pipeline
+from .pipeline import run_pipeline_async
 from .schemas import InputPayload, QueryPlan
 from .logger import EventLogger
 from .agent_reply import build_agent_reply, print_agent_reply
+from .llm.gemini_client import GeminiClient
 
 
 def interactive_loop() -> None:
+    asyncio.run(_interactive_loop())
+
+
+async def _interactive_loop() -> None:
     typer.echo("Research Thinking Agent (interactive mode)")
     typer.echo("Type a topic, or 'exit' to quit.\n")
 
     context: Optional[str] = None
+    client: Optional[GeminiClient] = None  # created on first use, reused across turns
+    loggers: Dict[Path, EventLogger] = {}
 
     while True:
         try:
@@ -43,21 +50,29 @@ def interactive_loop() -> None:
         payload = InputPayload(query=user_text, context=context)
 
         # Run the pipeline (Stage1 -> query_plan.json)
-        run_id, run_dir = run_pipeline(DEFAULT_CONFIG, payload)
+        # (already inside the event loop: await the async pipeline directly)
+        run_id, run_dir = await run_pipeline_async(DEFAULT_CONFIG, payload)
         run_dir_path = Path(run_dir)
 
         # Load query_plan.json
         qp: Optional[QueryPlan] = None
         qp_path = run_dir_path / "query_plan.json"
         if qp_path.exists():
-            with qp_path.open("r", encoding="utf-8") as f:
-                qp = QueryPlan.model_validate(json.load(f))
+            qp = QueryPlan.model_validate_json(qp_path.read_bytes())
 
-        # Use the same run folder log file
-        reply_logger = EventLogger(log_path=run_dir_path / "logs.jsonl")
+        # Use the same run folder log file (one logger per run dir per session)
+        reply_logger = loggers.get(run_dir_path)
+        if reply_logger is None:
+            reply_logger = loggers[run_dir_path] = EventLogger(
+                log_path=run_dir_path / "logs.jsonl",
+                debug=DEFAULT_CONFIG.debug_store_llm_raw,
+            )
 
         # Ask Gemini to produce an English, user-facing reply (summary/glossary/directions)
-        reply = build_agent_reply(payload, reply_logger, qp, run_dir_path)
+        if client is None:
+            client = GeminiClient.get_shared()
+        with reply_logger:
+            reply = await build_agent_reply(payload, reply_logger, qp, run_dir_path, client=client)
         print_agent_reply(reply, run_dir_path)
 
         # Simple rolling context
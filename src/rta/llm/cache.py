@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import base64
+import functools
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+from ..config import DEFAULT_CONFIG, RTAConfig
+
+
+def cache_key(**parts: Any) -> str:
+    """
+    Stable key for an LLM request: a hash over the canonical JSON of its inputs.
+
+    Keys only need to be collision-resistant, not cryptographic, so xxh3-128 is
+    used when xxhash is installed (SHA-256 otherwise).
+    """
+    blob = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS, default=str)
+    if HAS_XXHASH:
+        return xxhash.xxh3_128_hexdigest(blob)
+    return hashlib.sha256(blob).hexdigest()
+
+
+# A finished reasoning result depends only on what went in, so it is kept
+# longer than raw responses.
+RESULT_TTL_S = 7 * 24 * 3600
+# An embedding depends only on the text and the model: same reasoning.
+EMBEDDING_TTL_S = 7 * 24 * 3600
+
+
+def result_cache_key(query: str, paper_ids: Iterable[str], schema: Any) -> str:
+    """
+    Content address of a reasoning result: the query, the *set* of paper ids
+    (order and duplicates do not matter) and the schema's field names, so a
+    schema change invalidates old entries.
+    """
+    return cache_key(
+        kind="result",
+        query=query.strip(),
+        paper_ids=sorted({str(pid) for pid in paper_ids}),
+        schema=schema.__name__,
+        fields=sorted(getattr(schema, "model_fields", ())),
+    )
+
+
+# JSON string literals (escape-aware) and numbers, in document order.
+_JSON_LITERAL = re.compile(r'"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_WS = re.compile(r"\s+")
+
+
+def json_skeleton(text: str) -> Tuple[str, List[str]]:
+    """
+    Split (possibly broken) JSON into a structural skeleton and its literals.
+
+    Strings become "_", numbers become 0 and whitespace between tokens is
+    dropped, so two payloads with the same shape share one skeleton.
+    """
+    literals: List[str] = []
+
+    def _sub(m: "re.Match[str]") -> str:
+        tok = m.group(0)
+        literals.append(tok)
+        return '"_"' if tok.startswith('"') else "0"
+
+    return _WS.sub("", _JSON_LITERAL.sub(_sub, text)), literals
+
+
+def fill_skeleton(template: str, literals: List[str]) -> Optional[str]:
+    """
+    Inverse of json_skeleton: splice literals back into a skeleton, in order.
+    Returns None when the literal count does not match the template.
+    """
+    it = iter(literals)
+    missing = False
+
+    def _sub(m: "re.Match[str]") -> str:
+        nonlocal missing
+        tok = next(it, None)
+        if tok is None:
+            missing = True
+            return m.group(0)
+        return tok
+
+    out = _JSON_LITERAL.sub(_sub, template)
+    if missing or next(it, None) is not None:
+        return None
+    return out
+
+
+@dataclass
+class LLMCache:
+    """
+    Deterministic LLM response cache (JSON Lines, append-only).
+
+    Discipline:
+    - one entry per line: {key, ts, text, meta}
+    - last write wins when a key appears more than once
+    - entries older than ttl_s are treated as misses
+    - at most max_entries are kept (least recently used evicted first); the
+      file is rewritten with the live entries on load (when it held expired,
+      superseded or evicted lines) and whenever it reaches twice the cap
+    - recency is tracked in memory; a fresh load falls back to write order
+    - enabled=False turns every get into a miss and every set into a no-op
+    """
+    path: Path
+    ttl_s: float = 24 * 3600
+    max_entries: int = 500
+    enabled: bool = True
+    hits: int = 0
+    misses: int = 0
+    _entries: Optional["OrderedDict[str, Dict[str, Any]]"] = field(default=None, init=False, repr=False)
+    _file_rows: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @classmethod
+    def from_config(cls, cfg: RTAConfig) -> "LLMCache":
+        return cls(
+            path=Path(cfg.runs_dir) / "_cache" / "llm.jsonl",
+            ttl_s=cfg.cache_ttl_hours * 3600,
+            max_entries=int(os.getenv("RTA_LLM_CACHE_MAX_ENTRIES", "500")),
+        )
+
+    @classmethod
+    def results_from_config(cls, cfg: RTAConfig) -> "LLMCache":
+        """Store for whole results (see result_cache_key), next to the response cache."""
+        return cls(path=Path(cfg.runs_dir) / "_cache" / "results.jsonl", ttl_s=RESULT_TTL_S)
+
+    @classmethod
+    def embeddings_from_config(cls, cfg: RTAConfig) -> "LLMCache":
+        """Store for embeddings (see pack_vector), kept apart from the text responses."""
+        return cls(
+            path=Path(cfg.runs_dir) / "_cache" / "embeddings.jsonl",
+            ttl_s=EMBEDDING_TTL_S,
+            max_entries=int(os.getenv("RTA_EMBED_CACHE_MAX_ENTRIES", "2000")),
+        )
+
+    def _load(self) -> "OrderedDict[str, Dict[str, Any]]":
+        if self._entries is not None:
+            return self._entries
+        # file order is recency order: a re-stored key moves to the end
+        entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        rows = 0
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                for line in f:
+                    rows += 1
+                    try:
+                        rec = orjson.loads(line)
+                        key = rec["key"]
+                    except (ValueError, KeyError, TypeError):
+                        continue  # tolerate a torn last line
+                    entries.pop(key, None)
+                    entries[key] = rec
+        now = time.time()
+        for key in [k for k, rec in entries.items() if now - rec.get("ts", 0) > self.ttl_s]:
+            del entries[key]
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        self._entries = entries
+        self._file_rows = rows
+        if rows > len(entries):
+            self._rewrite()
+        return entries
+
+    def _rewrite(self) -> None:
+        """Replace the file with the live entries (atomically)."""
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            for rec in self._entries.values():
+                f.write(orjson.dumps(rec) + b"\n")
+        os.replace(tmp, self.path)
+        self._file_rows = len(self._entries)
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        if not self.enabled:
+            self.misses += 1
+            return None
+        with self._lock:
+            entries = self._load()
+            rec = entries.get(key)
+            if rec is None or time.time() - rec.get("ts", 0) > self.ttl_s:
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self.hits += 1
+            return rec["text"], dict(rec.get("meta") or {})
+
+    def set(self, key: str, text: str, meta: Dict[str, Any]) -> None:
+        if not self.enabled or self.max_entries <= 0:
+            return
+        rec = {"key": key, "ts": time.time(), "text": text, "meta": meta}
+        line = orjson.dumps(rec) + b"\n"
+        with self._lock:
+            entries = self._load()
+            entries.pop(key, None)
+            entries[key] = rec
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                f.write(line)
+            self._file_rows += 1
+            if self._file_rows >= 2 * self.max_entries:
+                self._rewrite()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def pack_vector(vector: Sequence[float]) -> str:
+    """An embedding as base64 float32: about a quarter of its JSON text."""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def unpack_vector(text: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(text), dtype=np.float32).tolist()
+
+
+@functools.cache
+def shared_result_cache() -> LLMCache:
+    """Process-wide result cache: one in-memory index per results.jsonl."""
+    return LLMCache.results_from_config(DEFAULT_CONFIG)
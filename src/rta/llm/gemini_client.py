@@ -1,31 +1,88 @@
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import Future
 from dataclasses import dataclass, field
+import functools
 import os
+import random
+import threading
 import time
-from typing import Any, Dict, Optional, Tuple
-
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
 
+from ..config import DEFAULT_CONFIG, load_env
 from ..logger import EventLogger
+from .cache import LLMCache, cache_key
+
+load_env()
+
+# Only near-deterministic calls are worth caching.
+_CACHE_MAX_TEMPERATURE = 0.2
+
+# Keep-alive pool shared by every request of one GeminiClient (sync and aio).
+_HTTP_LIMITS = {"max_keepalive_connections": 16, "max_connections": 32, "keepalive_expiry": 60}
+_HTTP_TIMEOUT_MS = 60_000
 
-load_dotenv()
+# Transient API failures (rate limit / overload) are retried in place with
+# capped exponential backoff and jitter; anything else raises immediately.
+_RETRY_STATUS = frozenset({429, 500, 503})
+_RETRY_MAX = 3
+_BACKOFF_BASE_S = 1.0
+_BACKOFF_CAP_S = 60.0
 
+# Pre-split attribute paths (ints index into lists).
+_PATH_CONTENT = ("content",)
+_PATH_PARTS = ("parts",)
+_PATH_PROMPT_FEEDBACK = ("prompt_feedback",)
+_PATH_SAFETY_RATINGS = ("candidates", 0, "safety_ratings")
 
-def _safe_getattr(obj: Any, path: str, default=None):
+
+@functools.cache
+def _sdk() -> Tuple[Any, Any]:
+    """
+    Import google-genai on first use: it pulls in gRPC/httpx stubs, which
+    should not be paid for by importers that never call the API.
+    """
+    from google import genai
+    from google.genai import types
+
+    return genai, types
+
+
+def _safe_getattr(obj: Any, path: Tuple[Union[str, int], ...], default=None):
     cur = obj
-    for p in path.split("."):
+    for p in path:
         if cur is None:
             return default
-        if isinstance(cur, dict):
+        if isinstance(p, int):
+            try:
+                cur = cur[p]
+            except (IndexError, KeyError, TypeError):
+                return default
+        elif isinstance(cur, dict):
             cur = cur.get(p, default)
         else:
             cur = getattr(cur, p, default)
     return cur if cur is not None else default
 
 
+def _retry_delay(err: BaseException, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retry number attempt+1 after err, or None when err is
+    not transient or retries are used up. A Retry-After header wins.
+    """
+    if getattr(err, "code", None) not in _RETRY_STATUS or attempt >= _RETRY_MAX:
+        return None
+    headers = getattr(getattr(err, "response", None), "headers", None)
+    retry_after = headers.get("retry-after") if headers is not None else None
+    if retry_after is not None:
+        try:
+            return min(_BACKOFF_CAP_S, max(0.0, float(retry_after)))
+        except ValueError:
+            pass  # HTTP-date form: fall back to our own schedule
+    return min(_BACKOFF_CAP_S, _BACKOFF_BASE_S * 2 ** attempt + random.random())
+
+
 def _extract_text_from_resp(resp: Any) -> str:
     """
     Best-effort extraction for google-genai responses across versions.
@@ -38,8 +95,8 @@ def _extract_text_from_resp(resp: Any) -> str:
     # 2) candidates[0].content.parts[].text
     cands = getattr(resp, "candidates", None)
     if cands and isinstance(cands, list) and len(cands) > 0:
-        content = _safe_getattr(cands[0], "content", None)
-        parts = _safe_getattr(content, "parts", None)
+        content = _safe_getattr(cands[0], _PATH_CONTENT, None)
+        parts = _safe_getattr(content, _PATH_PARTS, None)
         if parts and isinstance(parts, list):
             texts = []
             for part in parts:
@@ -56,6 +113,27 @@ def _extract_text_from_resp(resp: Any) -> str:
 class GeminiClient:
     api_key: str = field(repr=False)
     model: str = "gemini-3-flash"
+    cache: Optional[LLMCache] = field(default=None, repr=False)
+    _client: Any = field(default=None, init=False, repr=False)
+    # Single-flight: one API call per cache key at a time; identical calls made
+    # meanwhile (other threads or tasks) wait for its result instead.
+    _inflight: Dict[str, Future] = field(default_factory=dict, init=False, repr=False)
+    _inflight_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # One SDK client (and thus one TLS/HTTP pool) per GeminiClient.
+        import httpx
+
+        genai, types = _sdk()
+        limits = httpx.Limits(**_HTTP_LIMITS)
+        self._client = genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(
+                timeout=_HTTP_TIMEOUT_MS,
+                client_args={"limits": limits},
+                async_client_args={"limits": limits},
+            ),
+        )
 
     @classmethod
     def from_env(cls) -> "GeminiClient":
@@ -63,23 +141,132 @@ class GeminiClient:
         if not api_key:
             raise RuntimeError("GEMINI_API_KEY is not set. Please configure .env or environment variables.")
         model = os.getenv("GEMINI_MODEL", "gemini-3-flash").strip()
-        return cls(api_key=api_key, model=model)
+        return cls(api_key=api_key, model=model, cache=LLMCache.from_config(DEFAULT_CONFIG))
 
-    def generate_json(
+    @classmethod
+    def get_shared(cls) -> "GeminiClient":
+        """
+        Process-wide client from env, built on first use. Every caller shares
+        its keep-alive HTTP pool and loaded response cache.
+        """
+        return _shared_client()
+
+    def _cache_lookup(
         self,
         logger: EventLogger,
         stage: str,
         system: str,
         user: str,
-        schema_hint: Optional[str] = None,
-        temperature: float = 0.2,
-        max_output_tokens: int = 1024,
+        schema_hint: Optional[str],
+        temperature: float,
+        max_output_tokens: int,
+    ) -> Tuple[Optional[str], Optional[Tuple[str, Dict[str, Any]]]]:
+        """
+        Returns (cache_key, hit). cache_key is None when the call is not cacheable.
+        """
+        if self.cache is None or temperature > _CACHE_MAX_TEMPERATURE:
+            return None, None
+        key = cache_key(
+            model=self.model,
+            system=system,
+            user=user,
+            schema_hint=schema_hint,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+        )
+        hit = self.cache.get(key)
+        if hit is not None:
+            text, meta = hit
+            logger.log(stage, "llm_cache_hit", {"model": self.model, **self.cache.stats()})
+            return key, (text, {**meta, "cached": True})
+        logger.log(stage, "llm_cache_miss", {"model": self.model, **self.cache.stats()})
+        return key, None
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """(future of the call in flight for key, True if the caller must make it)."""
+        with self._inflight_lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut, False
+            fut = self._inflight[key] = Future()
+            return fut, True
+
+    def _release(self, key: str, fut: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        if isinstance(error, Exception):
+            fut.set_exception(error)
+        else:
+            # success, or the leader was cancelled (None: a waiter calls itself)
+            fut.set_result(result)
+
+    def _coalesce(self, key: Optional[str], call: Callable[[], Tuple[str, Dict[str, Any]]]) -> Tuple[str, Dict[str, Any]]:
+        if key is None:
+            return call()
+        while True:
+            fut, leader = self._claim(key)
+            if leader:
+                break
+            result = fut.result()
+            if result is not None:
+                return result[0], {**result[1], "coalesced": True}
+        try:
+            result = call()
+        except BaseException as e:
+            self._release(key, fut, error=e)
+            raise
+        self._release(key, fut, result=result)
+        return result
+
+    async def _acoalesce(
+        self, key: Optional[str], call: Callable[[], Awaitable[Tuple[str, Dict[str, Any]]]]
     ) -> Tuple[str, Dict[str, Any]]:
-        client = genai.Client(api_key=self.api_key)
+        if key is None:
+            return await call()
+        while True:
+            fut, leader = self._claim(key)
+            if leader:
+                break
+            # shield: a cancelled waiter must not cancel the shared future
+            result = await asyncio.shield(asyncio.wrap_future(fut))
+            if result is not None:
+                return result[0], {**result[1], "coalesced": True}
+        try:
+            result = await call()
+        except BaseException as e:
+            self._release(key, fut, error=e)
+            raise
+        self._release(key, fut, result=result)
+        return result
+
+    def _backoff(self, logger: EventLogger, stage: str, err: BaseException, attempt: int) -> float:
+        """Delay before retrying after err; re-raises err when it is not retryable."""
+        delay = _retry_delay(err, attempt)
+        if delay is None:
+            raise err
+        logger.log(stage, "llm_retry", {
+            "model": self.model,
+            "status_code": getattr(err, "code", None),
+            "attempt": attempt + 1,
+            "delay_s": round(delay, 2),
+        })
+        return delay
 
+    def _prepare_request(
+        self,
+        logger: EventLogger,
+        stage: str,
+        system: str,
+        user: str,
+        schema_hint: Optional[str],
+        temperature: float,
+        max_output_tokens: int,
+    ) -> Tuple[str, Any]:
+        _, types = _sdk()
         prompt = user
         if schema_hint:
-            prompt = f"{user}\n\n[SCHEMA_HINT]\n{schema_hint}"
+            # static hint ahead of the per-request text: a reusable prompt prefix
+            prompt = f"[SCHEMA_HINT]\n{schema_hint}\n\n{user}"
 
         cfg = types.GenerateContentConfig(
             temperature=temperature,
@@ -94,16 +281,19 @@ class GeminiClient:
             "max_output_tokens": max_output_tokens,
             "has_schema_hint": bool(schema_hint),
         })
+        return prompt, cfg
 
-        t0 = time.time()
-        resp = client.models.generate_content(
-            model=self.model,
-            contents=prompt,
-            config=cfg,
-        )
-        latency_ms = int((time.time() - t0) * 1000)
-
-        text = _extract_text_from_resp(resp)
+    def _finish_response(
+        self,
+        logger: EventLogger,
+        stage: str,
+        resp: Any,
+        latency_ms: int,
+        key: Optional[str],
+        text: Optional[str] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        if text is None:
+            text = _extract_text_from_resp(resp)
 
         # capture useful meta for debugging
         finish_reason = None
@@ -114,8 +304,8 @@ class GeminiClient:
         except Exception:
             pass
 
-        prompt_feedback = _safe_getattr(resp, "prompt_feedback", None)
-        safety_ratings = _safe_getattr(resp, "candidates.0.safety_ratings", None)
+        prompt_feedback = _safe_getattr(resp, _PATH_PROMPT_FEEDBACK, None)
+        safety_ratings = _safe_getattr(resp, _PATH_SAFETY_RATINGS, None)
 
         logger.log(stage, "llm_response", {
             "model": self.model,
@@ -138,4 +328,156 @@ class GeminiClient:
                 "Gemini returned empty text. Possible causes: quota/rate-limit, safety block, or SDK response format."
             )
 
-        return text, {"model": self.model, "latency_ms": latency_ms, "finish_reason": str(finish_reason) if finish_reason else None}
+        meta = {"model": self.model, "latency_ms": latency_ms, "finish_reason": str(finish_reason) if finish_reason else None}
+        if key is not None:
+            self.cache.set(key, text, meta)
+        return text, meta
+
+    def generate_json(
+        self,
+        logger: EventLogger,
+        stage: str,
+        system: str,
+        user: str,
+        schema_hint: Optional[str] = None,
+        temperature: float = 0.2,
+        max_output_tokens: int = 1024,
+    ) -> Tuple[str, Dict[str, Any]]:
+        args = (logger, stage, system, user, schema_hint, temperature, max_output_tokens)
+        key, hit = self._cache_lookup(*args)
+        if hit is not None:
+            return hit
+
+        def call() -> Tuple[str, Dict[str, Any]]:
+            prompt, cfg = self._prepare_request(*args)
+
+            t0 = time.time()
+            attempt = 0
+            while True:
+                try:
+                    resp = self._client.models.generate_content(
+                        model=self.model,
+                        contents=prompt,
+                        config=cfg,
+                    )
+                    break
+                except Exception as e:
+                    time.sleep(self._backoff(logger, stage, e, attempt))
+                    attempt += 1
+            latency_ms = int((time.time() - t0) * 1000)
+
+            return self._finish_response(logger, stage, resp, latency_ms, key)
+
+        return self._coalesce(key, call)
+
+    async def agenerate_json(
+        self,
+        logger: EventLogger,
+        stage: str,
+        system: str,
+        user: str,
+        schema_hint: Optional[str] = None,
+        temperature: float = 0.2,
+        max_output_tokens: int = 1024,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Async variant of generate_json (google-genai aio client).
+        Cancelling the awaiting task aborts the in-flight request.
+        """
+        args = (logger, stage, system, user, schema_hint, temperature, max_output_tokens)
+        key, hit = self._cache_lookup(*args)
+        if hit is not None:
+            return hit
+
+        async def call() -> Tuple[str, Dict[str, Any]]:
+            prompt, cfg = self._prepare_request(*args)
+
+            t0 = time.time()
+            attempt = 0
+            while True:
+                try:
+                    resp = await self._client.aio.models.generate_content(
+                        model=self.model,
+                        contents=prompt,
+                        config=cfg,
+                    )
+                    break
+                except Exception as e:
+                    await asyncio.sleep(self._backoff(logger, stage, e, attempt))
+                    attempt += 1
+            latency_ms = int((time.time() - t0) * 1000)
+
+            return self._finish_response(logger, stage, resp, latency_ms, key)
+
+        return await self._acoalesce(key, call)
+
+    async def agenerate_json_stream(
+        self,
+        logger: EventLogger,
+        stage: str,
+        system: str,
+        user: str,
+        schema_hint: Optional[str] = None,
+        temperature: float = 0.2,
+        max_output_tokens: int = 1024,
+        accept: Optional[Callable[[bytes], bool]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Streaming variant of agenerate_json.
+
+        After each chunk, a brace-balanced buffer is offered to accept(); when it
+        returns True the stream is closed early and the buffer is the result.
+        """
+        args = (logger, stage, system, user, schema_hint, temperature, max_output_tokens)
+        key, hit = self._cache_lookup(*args)
+        if hit is not None:
+            return hit
+
+        prompt, cfg = self._prepare_request(*args)
+
+        t0 = time.time()
+        buf = bytearray()
+        last_chunk: Any = None
+        early = False
+        attempt = 0
+        while True:
+            try:
+                stream = await self._client.aio.models.generate_content_stream(
+                    model=self.model,
+                    contents=prompt,
+                    config=cfg,
+                )
+                break
+            except Exception as e:
+                await asyncio.sleep(self._backoff(logger, stage, e, attempt))
+                attempt += 1
+        try:
+            async for chunk in stream:
+                last_chunk = chunk
+                piece = _extract_text_from_resp(chunk)
+                if not piece:
+                    continue
+                buf += piece.encode("utf-8")
+                if (
+                    accept is not None
+                    and buf.lstrip().startswith(b"{")
+                    and buf.count(b"{") == buf.count(b"}")
+                    and accept(bytes(buf))
+                ):
+                    early = True
+                    break
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        latency_ms = int((time.time() - t0) * 1000)
+
+        if early:
+            logger.log(stage, "llm_stream_early_accept", {"model": self.model, "bytes": len(buf)})
+        return self._finish_response(logger, stage, last_chunk, latency_ms, key, text=buf.decode("utf-8"))
+
+
+@functools.cache
+def _shared_client() -> GeminiClient:
+    # a failed from_env() raises and is not cached, so it is retried next time
+    return GeminiClient.from_env()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import functools
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import orjson
+
+from ..config import RTAConfig
+
+
+@functools.cache
+def _analyzer() -> Callable[[str], List[str]]:
+    # sklearn is already a dependency (topic mining); import it on first use
+    from sklearn.feature_extraction.text import CountVectorizer
+    return CountVectorizer(stop_words="english").build_analyzer()
+
+
+def topic_keywords(*texts: str) -> FrozenSet[str]:
+    """Lower-cased, stop-word-free word set of the given texts."""
+    analyze = _analyzer()
+    return frozenset(w for t in texts if t for w in analyze(t))
+
+
+def result_skeleton(result: Any) -> Optional[Dict[str, Any]]:
+    """
+    The reusable shape of a reasoning result: its cluster names, the claim
+    types it used and its gap descriptions. Paper ids and evidence are left
+    out, they belong to one retrieval only.
+    """
+    clusters = getattr(result, "clusters", None) or []
+    claims = getattr(result, "claims", None) or []
+    gaps = getattr(result, "research_gaps", None) or []
+    names = [n for n in (getattr(c, "cluster_name", None) for c in clusters) if n]
+    if not names and not claims:
+        return None
+    return {
+        "cluster_names": names,
+        "claim_types": sorted({str(getattr(c, "claim_type", "")) for c in claims} - {""}),
+        "gap_templates": [d for d in (getattr(g, "description", None) for g in gaps) if d],
+    }
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class PlanCache:
+    """
+    Cache of reasoning *skeletons* (JSON Lines, append-only), keyed by topic
+    keywords. A hit is not an answer: it is handed to the draft prompt as a
+    starting template, which the model adapts to the new papers.
+
+    Discipline:
+    - one entry per line: {ts, keywords, skeleton}
+    - the same keyword set stored again replaces the older entry
+    - a lookup takes the best Jaccard match above `threshold`
+    - entries older than ttl_s are ignored
+    """
+    path: Path
+    threshold: float = 0.5
+    ttl_s: float = 24 * 3600
+    hits: int = 0
+    misses: int = 0
+    _entries: Optional[Dict[FrozenSet[str], Tuple[float, Dict[str, Any]]]] = field(
+        default=None, init=False, repr=False
+    )
+
+    @classmethod
+    def from_config(cls, cfg: RTAConfig) -> "PlanCache":
+        return cls(
+            path=Path(cfg.runs_dir) / "_cache" / "plans.jsonl",
+            ttl_s=cfg.cache_ttl_hours * 3600,
+        )
+
+    def _load(self) -> Dict[FrozenSet[str], Tuple[float, Dict[str, Any]]]:
+        if self._entries is not None:
+            return self._entries
+        entries: Dict[FrozenSet[str], Tuple[float, Dict[str, Any]]] = {}
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                for line in f:
+                    try:
+                        rec = orjson.loads(line)
+                        entries[frozenset(rec["keywords"])] = (float(rec["ts"]), rec["skeleton"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # tolerate a torn last line
+        self._entries = entries
+        return entries
+
+    def lookup(self, keywords: Iterable[str]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Best (similarity, skeleton) above the threshold, else None."""
+        kw = frozenset(keywords)
+        now = time.time()
+        best: Optional[Tuple[float, Dict[str, Any]]] = None
+        for stored, (ts, skeleton) in self._load().items():
+            if now - ts > self.ttl_s:
+                continue
+            score = _jaccard(kw, stored)
+            if score > self.threshold and (best is None or score > best[0]):
+                best = (score, skeleton)
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def upsert(self, keywords: Iterable[str], skeleton: Dict[str, Any]) -> None:
+        kw = frozenset(keywords)
+        if not kw:
+            return
+        rec = {"ts": time.time(), "keywords": sorted(kw), "skeleton": skeleton}
+        self._load()[kw] = (rec["ts"], skeleton)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as f:
+            f.write(orjson.dumps(rec) + b"\n")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._load())}
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from ..config import RTAConfig
+
+
+@dataclass
+class SemanticCache:
+    """
+    Nearest-neighbour response cache (JSON Lines, append-only).
+
+    A result is stored next to the embedding of the request that produced it;
+    a later request whose embedding is at least `threshold` cosine-similar
+    reuses that result instead of calling the model.
+
+    Discipline:
+    - one entry per line: {ts, vector, text}
+    - vectors are L2-normalized on the way in, so similarity is a dot product
+    - entries older than ttl_s are ignored, and dropped when the file loads
+    - at most max_entries are kept: above that the least recently used entry
+      is evicted; the file is rewritten with the live entries on load (when
+      it held dead ones) and whenever it reaches twice the cap
+    - an entry may carry a tag; it only matches requests with the same tag
+    - off unless a threshold in (0, 1] is configured (RTA_SEMCACHE_THRESHOLD,
+      or the env var the caller names): a hit returns an answer to a
+      *different* request, which is opt-in per cache
+    """
+    path: Path
+    threshold: float = 0.0
+    ttl_s: float = 24 * 3600
+    max_entries: int = 1024
+    hits: int = 0
+    misses: int = 0
+    # rows [0, _n) of a float32 matrix that grows by doubling
+    _vectors: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+    _n: int = field(default=0, init=False, repr=False)
+    _ts: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+    _used: Optional[np.ndarray] = field(default=None, init=False, repr=False)
+    _texts: List[str] = field(default_factory=list, init=False, repr=False)
+    _tags: List[str] = field(default_factory=list, init=False, repr=False)
+    _file_rows: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @classmethod
+    def from_config(
+        cls, cfg: RTAConfig, name: str = "semantic", env: str = "RTA_SEMCACHE_THRESHOLD"
+    ) -> "SemanticCache":
+        return cls(
+            path=Path(cfg.runs_dir) / "_cache" / f"{name}.jsonl",
+            threshold=float(os.getenv(env, "0") or 0),
+            ttl_s=cfg.cache_ttl_hours * 3600,
+            max_entries=int(os.getenv("RTA_SEMCACHE_MAX_ENTRIES", "1024")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return 0.0 < self.threshold <= 1.0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> Optional[np.ndarray]:
+        v = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(v))
+        if not v.size or norm == 0.0:
+            return None
+        return v / norm
+
+    def _reserve(self, dim: int, rows: int) -> None:
+        """Room for `rows` entries of size `dim` (amortized O(1) per add)."""
+        if self._vectors is not None and self._vectors.shape[0] >= rows:
+            return
+        cap = max(16, rows, 2 * (self._vectors.shape[0] if self._vectors is not None else 0))
+        vectors = np.empty((cap, dim), dtype=np.float32)
+        ts = np.empty(cap)
+        used = np.empty(cap)
+        if self._n:
+            vectors[:self._n] = self._vectors[:self._n]
+            ts[:self._n] = self._ts[:self._n]
+            used[:self._n] = self._used[:self._n]
+        self._vectors, self._ts, self._used = vectors, ts, used
+
+    def _load(self) -> None:
+        if self._vectors is not None:
+            return
+        recs: List[Tuple[np.ndarray, str, float, str]] = []
+        file_rows = 0
+        if self.path.exists():
+            now = time.time()
+            with self.path.open("rb") as f:
+                for line in f:
+                    file_rows += 1
+                    try:
+                        rec = orjson.loads(line)
+                        v = self._normalize(rec["vector"])
+                        text, ts = rec["text"], float(rec["ts"])
+                        tag = str(rec.get("tag", ""))
+                    except (ValueError, KeyError, TypeError):
+                        continue  # tolerate a torn last line
+                    if v is None or (recs and v.shape != recs[0][0].shape):
+                        continue  # embedding model changed: not comparable
+                    if now - ts > self.ttl_s:
+                        continue
+                    recs.append((v, text, ts, tag))
+        # the newest entries survive the cap
+        recs = recs[-self.max_entries:] if self.max_entries > 0 else []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._ts = self._used = np.empty(0)
+        if recs:
+            self._reserve(recs[0][0].shape[0], len(recs))
+            for i, (v, text, ts, tag) in enumerate(recs):
+                self._vectors[i] = v
+                self._ts[i] = self._used[i] = ts
+                self._texts.append(text)
+                self._tags.append(tag)
+            self._n = len(recs)
+        self._file_rows = file_rows
+        if file_rows > self._n:
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        """Replace the file with the live entries (atomically)."""
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            for i in range(self._n):
+                rec = {"ts": float(self._ts[i]), "vector": self._vectors[i].tolist(), "text": self._texts[i]}
+                if self._tags[i]:
+                    rec["tag"] = self._tags[i]
+                f.write(orjson.dumps(rec) + b"\n")
+        os.replace(tmp, self.path)
+        self._file_rows = self._n
+
+    def _evict(self) -> None:
+        """Drop the least recently used entry (the last row moves into its slot)."""
+        i = int(np.argmin(self._used[:self._n]))
+        last = self._n - 1
+        if i != last:
+            self._vectors[i] = self._vectors[last]
+            self._ts[i] = self._ts[last]
+            self._used[i] = self._used[last]
+            self._texts[i] = self._texts[last]
+            self._tags[i] = self._tags[last]
+        self._texts.pop()
+        self._tags.pop()
+        self._n = last
+
+    def lookup(self, vector: Sequence[float], tag: str = "") -> Optional[Tuple[float, str]]:
+        """Best (similarity, text) at or above the threshold among entries tagged `tag`, else None."""
+        v = self._normalize(vector)
+        with self._lock:
+            self._load()
+            if v is None or not self._n or v.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+            sims = self._vectors[:self._n] @ v
+            # best score first; on a tie the newest, so a re-stored result
+            # beats the stale one it replaced
+            order = np.lexsort((-self._ts[:self._n], -sims))
+            now = time.time()
+            for i in order:
+                score = float(sims[i])
+                if score < self.threshold:
+                    break
+                if self._tags[i] == tag and now - self._ts[i] <= self.ttl_s:
+                    self._used[i] = now
+                    self.hits += 1
+                    return score, self._texts[i]
+            self.misses += 1
+            return None
+
+    def add(self, vector: Sequence[float], text: str, tag: str = "") -> None:
+        v = self._normalize(vector)
+        if v is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._load()
+            if self._n and v.shape[0] != self._vectors.shape[1]:
+                return  # different embedding size than the stored entries
+            if not self._n:
+                self._vectors = None  # (re)shape for this embedding size
+                self._reserve(v.shape[0], 16)
+            while self._n >= self.max_entries:
+                self._evict()
+            self._reserve(v.shape[0], self._n + 1)
+            now = time.time()
+            i = self._n
+            self._vectors[i] = v
+            self._ts[i] = self._used[i] = now
+            self._texts.append(text)
+            self._tags.append(tag)
+            self._n += 1
+
+            rec = {"ts": now, "vector": v.tolist(), "text": text}
+            if tag:
+                rec["tag"] = tag
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                f.write(orjson.dumps(rec) + b"\n")
+            self._file_rows += 1
+            if self._file_rows >= 2 * self.max_entries:
+                self._rewrite()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": self._n}
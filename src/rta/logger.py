@@ -1,10 +1,16 @@
 from __future__ import annotations
 
-import json
+import os
+import threading
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+_MAX_BUFFERED = 512  # events held before an implicit flush
 
 
 @dataclass
@@ -16,16 +22,78 @@ class EventLogger:
     - fixed fields (ts, stage, event)
     - meta dict reserved for structured diagnostics
     - one event per line (append-only)
+    - events are buffered in memory; flush() at stage boundaries writes them
+      with one writev() call, close() flushes and releases the fd
+      (the fd is reopened lazily, so logging after close() is safe)
+    - one fd per logger for its whole life, opened O_APPEND; buffer and fd are
+      guarded by a lock so pipeline worker threads can share one logger
     """
     log_path: Path
+    debug: bool = False  # emit verbose diagnostics (e.g. raw LLM previews)
+    _buf: List[bytes] = field(default_factory=list, init=False, repr=False)
+    _fd: Optional[int] = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _ts: Tuple[int, str] = field(default=(-1, ""), init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def __enter__(self) -> "EventLogger":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        # safety net for loggers that are dropped without close()
+        try:
+            self.close()
+        except Exception:
+            pass
 
     def log(self, stage: str, event: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        # ts has 1s resolution: format once per second, not once per event
+        # (second and string swap together, so threads never mix them)
+        sec = int(time.time())
+        ts_sec, ts_str = self._ts
+        if sec != ts_sec:
+            ts_str = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+            self._ts = (sec, ts_str)
         record = {
-            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+            "ts": ts_str,
             "stage": stage,
             "event": event,
             "meta": meta or {},
         }
-        self.log_path.parent.mkdir(parents=True, exist_ok=True)
-        with self.log_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        line = orjson.dumps(record, default=str) + b"\n"
+        with self._lock:
+            self._buf.append(line)
+            if len(self._buf) >= _MAX_BUFFERED:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buf:
+            return
+        if self._fd is None:
+            self._fd = os.open(self.log_path, _OPEN_FLAGS, 0o644)
+        buf, self._buf = self._buf, []
+        if hasattr(os, "writev"):
+            written = os.writev(self._fd, buf)
+            total = sum(map(len, buf))
+            if written < total:  # short write: finish the tail
+                data = memoryview(b"".join(buf))[written:]
+                while data:
+                    data = data[os.write(self._fd, data):]
+        else:
+            os.write(self._fd, b"".join(buf))
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
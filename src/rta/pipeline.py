@@ -3,36 +3,76 @@ Main Pipeline Execution Module.
 File: src/rta/pipeline.py
 """
 
+import asyncio
+import functools
+import importlib
 import logging
-import json
 import os
-from typing import Optional, Any, Union, Tuple
-
-# --- Import Stage Modules ---
-from rta.stages.query_plan_gemini import run_query_planning
-from rta.stages.retrieval_live import run_retrieval
-from rta.stages.topic_miner import TopicMiningService
-from rta.stages.reasoning_engine import ReasoningEngine
+import threading
+from pathlib import Path
+from typing import Optional, Any, Awaitable, Callable, Dict, Union, Tuple
 
 # --- Import Utils ---
-try:
-    from rta.utils.llm_client import get_default_client
-except ImportError:
-    class MockClient:
-        def generate(self, *args, **kwargs): return "Mock Response"
-        def get_embedding(self, *args, **kwargs): return [0.1]*768
-    def get_default_client(): return MockClient()
+from rta.utils.llm_client import MockGeminiClient, get_default_client
 
 # --- Import UI ---
 from rta.utils.ui import spinner, print_header
 
+from pydantic import BaseModel
+
+from rta.dag import DAGPipeline, StageTask
+from rta.llm.cache import shared_result_cache
+from rta.logger import EventLogger
+from rta.report import render_markdown
+from rta.run_manager import RunArtifacts, update_status
+from rta.schemas import RunStatus, StageStatus
+
 logger = logging.getLogger(__name__)
 
+_MAX_WORKERS = 4
+
+
+class _StageAbort(Exception):
+    """A stage failed and has already been logged; stop the run."""
+
+
+def _load(module: str, attr: str) -> Callable[[Dict[str, Any]], Any]:
+    """DAG task that imports a stage module (stage modules load lazily)."""
+    def run(results: Dict[str, Any]) -> Any:
+        return getattr(importlib.import_module(module), attr)
+    return run
+
+
+@functools.cache
+def _semantic_cache() -> Any:
+    """Process-wide stage-4 semantic cache (its entries load once per session)."""
+    from rta.config import DEFAULT_CONFIG
+    from rta.llm.semantic_cache import SemanticCache
+    return SemanticCache.from_config(DEFAULT_CONFIG)
+
+
+@functools.cache
+def _plan_cache() -> Any:
+    """Process-wide stage-4 plan-skeleton cache."""
+    from rta.config import DEFAULT_CONFIG
+    from rta.llm.plan_cache import PlanCache
+    return PlanCache.from_config(DEFAULT_CONFIG)
+
+
 def run_pipeline(topic: Union[str, Any], output_dir: Union[str, Any] = "outputs") -> Tuple[bool, str]:
     """
     Executes the full RTA research pipeline (End-to-End).
     Returns: (success: bool, output_directory_path: str)
     """
+    return asyncio.run(run_pipeline_async(topic, output_dir))
+
+
+async def run_pipeline_async(topic: Union[str, Any], output_dir: Union[str, Any] = "outputs") -> Tuple[bool, str]:
+    """
+    Async variant of run_pipeline: network-bound stages share one event loop,
+    so retrieval fans its queries out concurrently and blocking LLM stages run
+    in worker threads alongside pending artifact writes.
+    """
     
     # --- Argument Handling ---
     real_topic = topic
@@ -60,28 +100,58 @@ def run_pipeline(topic: Union[str, Any], output_dir: Union[str, Any] = "outputs"
     # Initialize Client
     llm_client = get_default_client() 
     
-    # Define report path
-    md_path = os.path.join(real_output_dir, "report.md") # Changed to standard name
+    # Run bookkeeping: artifacts and the run status are kept in memory and
+    # written once at the end of the run (also when a stage fails).
+    run_dir = Path(real_output_dir)
+    artifacts = RunArtifacts()
+    status = RunStatus(run_id=run_dir.name, stages=StageStatus())
+    events = EventLogger(run_dir / "logs.jsonl")
+    lock = threading.Lock()
+
+    def _mark(stage_key: str, state: str, error: Optional[Exception] = None) -> None:
+        with lock:
+            setattr(status.stages, stage_key, state)
+            if error is not None:
+                status.error = {"stage": stage_key, "message": str(error)}
+            events.log(stage_key, state, {"error": str(error)} if error else None)
+            if state != "running":
+                events.flush()  # one write per stage
+
+    def _tracked(stage_key: str, label: str, fn: Callable[[Dict[str, Any]], Awaitable[Any]]):
+        async def run(results: Dict[str, Any]) -> Any:
+            _mark(stage_key, "running")
+            try:
+                out = await fn(results)
+            except _StageAbort as e:
+                _mark(stage_key, "failed", e)
+                raise
+            except Exception as e:
+                logger.error(f"[Fail] {label} Error: {e}")
+                _mark(stage_key, "failed", e)
+                raise _StageAbort(str(e)) from e
+            _mark(stage_key, "ok")
+            return out
+        return run
 
     # ------------------------------------------------------------------
     # Stage 1: Query Planning
     # ------------------------------------------------------------------
-    with spinner("Stage 1: Planning search strategy..."):
-        try:
-            plan = run_query_planning(real_topic)
+    async def stage_plan(results):
+        from rta.stages.query_plan_gemini import run_query_planning
+        with spinner("Stage 1: Planning search strategy..."):
+            plan = await asyncio.to_thread(run_query_planning, real_topic)
             logger.info(f"   -> Generated {len(plan.expanded_queries)} search queries")
             # [FIX] Use standard filename for CLI compatibility
-            _save_json(plan, real_output_dir, "plan.json") 
-        except Exception as e:
-            logger.error(f"[Fail] Stage 1 Error: {e}")
-            return False, ""
+            artifacts.stage("plan.json", _to_jsonable(plan))
+            return plan
 
     # ------------------------------------------------------------------
     # Stage 2: Literature Retrieval
     # ------------------------------------------------------------------
-    with spinner("Stage 2: Searching literature (arXiv/Scholar)..."):
-        try:
-            retrieval_results = run_retrieval(plan.expanded_queries)
+    async def stage_retrieval(results):
+        from rta.stages.retrieval_live import run_retrieval_async
+        with spinner("Stage 2: Searching literature (arXiv/Scholar)..."):
+            retrieval_results = await run_retrieval_async(results["plan"].expanded_queries)
             
             papers = getattr(retrieval_results, 'papers', []) 
             if not papers and isinstance(retrieval_results, list):
@@ -89,69 +159,100 @@ def run_pipeline(topic: Union[str, Any], output_dir: Union[str, Any] = "outputs"
 
             logger.info(f"   -> Retrieved {len(papers)} papers")
             # [FIX] Use standard filename
-            _save_json(retrieval_results, real_output_dir, "retrieval.json") 
+            artifacts.stage("retrieval.json", _to_jsonable(retrieval_results))
+            return retrieval_results, papers
 
-            if not papers:
-                logger.warning("[Warn] No papers found. Aborting.")
-                return False, ""
-        except Exception as e:
-            logger.error(f"[Fail] Stage 2 Error: {e}")
-            return False, ""
+    def check_papers(results):
+        if not results["retrieval"][1]:
+            logger.warning("[Warn] No papers found. Aborting.")
+            err = _StageAbort("No papers found")
+            _mark("stage2", "failed", err)
+            raise err
+        return results["retrieval"][1]
 
     # ------------------------------------------------------------------
     # Stage 3: Topic Structuring
     # ------------------------------------------------------------------
-    with spinner("Stage 3: Clustering & Structuring topics..."):
-        try:
-            miner = TopicMiningService(llm_client=llm_client)
-            structuring_result = miner.execute(papers)
+    async def stage_structuring(results):
+        with spinner("Stage 3: Clustering & Structuring topics..."):
+            miner = results["miner_cls"](llm_client=llm_client)
+            structuring_result = await asyncio.to_thread(miner.execute, results["papers"])
             
-            if structuring_result:
-                cluster_count = len(structuring_result.clusters)
-                logger.info(f"   -> Identified {cluster_count} research sub-topics")
-                # [FIX] Use standard filename
-                _save_json(structuring_result, real_output_dir, "structuring.json")
-            else:
+            if not structuring_result:
                 logger.error("[Fail] Stage 3 returned None")
-                return False, ""
-        except Exception as e:
-            logger.error(f"[Fail] Stage 3 Error: {e}")
-            return False, ""
+                raise _StageAbort("Stage 3 returned None")
+            cluster_count = len(structuring_result.clusters)
+            logger.info(f"   -> Identified {cluster_count} research sub-topics")
+            # [FIX] Use standard filename
+            artifacts.stage("structuring.json", _to_jsonable(structuring_result))
+            return structuring_result
 
     # ------------------------------------------------------------------
     # Stage 4: Reasoning Agent
     # ------------------------------------------------------------------
-    with spinner("Stage 4: Reasoning & Self-Refining (This may take time)..."):
-        try:
-            engine = ReasoningEngine(llm_client=llm_client)
-            final_report = engine.run(plan, structuring_result, papers)
+    async def stage_reasoning(results):
+        with spinner("Stage 4: Reasoning & Self-Refining (This may take time)..."):
+            # mock embeddings carry no meaning, so they never key the cache
+            # (nor do mock results make templates worth reusing)
+            is_mock = isinstance(llm_client, MockGeminiClient)
+            engine = results["engine_cls"](
+                llm_client=llm_client,
+                semantic_cache=None if is_mock else _semantic_cache(),
+                plan_cache=None if is_mock else _plan_cache(),
+                result_cache=None if is_mock else shared_result_cache(),
+                # optional cheaper draft tier / stronger refine tier
+                draft_model=os.getenv("GEMINI_DRAFT_MODEL") or None,
+                refine_model=os.getenv("GEMINI_REFINE_MODEL") or None,
+            )
+            final_report = await asyncio.to_thread(
+                engine.run, results["plan"], results["structuring"], results["papers"],
+                topic=real_topic,
+            )
             
             report_topic = getattr(final_report, 'topic', real_topic)
             logger.info(f"   -> Report generated! Topic: {report_topic}")
-            # [FIX] Use standard filename
-            _save_json(final_report, real_output_dir, "reasoning.json")
-            
-            # Markdown Generation
-            with open(md_path, "w", encoding="utf-8") as f:
-                f.write(f"# {report_topic}\n\n")
-                
-                clusters = getattr(final_report, 'clusters', [])
-                for c in clusters:
-                    # Robust access
-                    if isinstance(c, dict):
-                        c_name = c.get('cluster_name', c.get('name', 'Cluster'))
-                        c_desc = c.get('description', '')
-                    else:
-                        c_name = getattr(c, 'cluster_name', getattr(c, 'name', 'Cluster'))
-                        c_desc = getattr(c, 'description', '')
-                        
-                    f.write(f"## {c_name}\n{c_desc}\n\n")
-                    
-            logger.info(f"   -> Markdown saved to: {md_path}")
-
-        except Exception as e:
-            logger.error(f"[Fail] Stage 4 Error: {e}")
-            return False, ""
+            return final_report
+
+    def write_report(results):
+        final_report = results["reasoning"]
+        # [FIX] Use standard filename
+        artifacts.stage("reasoning.json", _to_jsonable(final_report))
+        artifacts.stage("report.md", render_markdown(final_report, real_topic))
+
+    # Heavy stage modules (sklearn for topic mining) import in a worker
+    # thread while stages 1-2 wait on the network.
+    graph = DAGPipeline([
+        StageTask("miner_cls", _load("rta.stages.topic_miner", "TopicMiningService")),
+        StageTask("engine_cls", _load("rta.stages.reasoning_engine", "ReasoningEngine")),
+        StageTask("plan", _tracked("stage1", "Stage 1", stage_plan)),
+        StageTask("retrieval", _tracked("stage2", "Stage 2", stage_retrieval), ("plan",)),
+        StageTask("papers", check_papers, ("retrieval",)),
+        StageTask("structuring", _tracked("stage3", "Stage 3", stage_structuring), ("papers", "miner_cls")),
+        StageTask("reasoning", _tracked("stage4", "Stage 4", stage_reasoning), ("plan", "structuring", "papers", "engine_cls")),
+        StageTask("report", write_report, ("reasoning",)),
+    ], max_workers=_MAX_WORKERS)
+
+    ok = True
+    try:
+        await graph.arun()
+    except _StageAbort:
+        ok = False
+    except Exception as e:
+        logger.error(f"[Fail] Pipeline Error: {e}")
+        ok = False
+    finally:
+        events.close()
+        # Single end-of-run commit: whatever was staged, then the final status
+        try:
+            artifacts.flush(run_dir)
+            update_status(run_dir, status)
+        except OSError as e:
+            logger.error(f"[Pipeline] Could not write run artifacts: {e}")
+            ok = False
+    if not ok:
+        return False, ""
+
+    logger.info(f"   -> Markdown saved to: {os.path.join(real_output_dir, 'report.md')}")
 
     print_header("Pipeline Completed", f"Results saved in: {real_output_dir}")
     
@@ -159,19 +260,13 @@ def run_pipeline(topic: Union[str, Any], output_dir: Union[str, Any] = "outputs"
     return True, real_output_dir
 
 
-def _save_json(obj, folder, filename):
-    """Helper: Save object to JSON."""
-    try:
-        path = os.path.join(folder, filename)
-        with open(path, "w", encoding="utf-8") as f:
-            if hasattr(obj, "model_dump"):
-                data = obj.model_dump()
-            elif hasattr(obj, "dict"):
-                data = obj.dict()
-            elif hasattr(obj, "__dict__"):
-                data = obj.__dict__
-            else:
-                data = str(obj)
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.warning(f"[Pipeline] Could not save JSON {filename}: {e}")
\ No newline at end of file
+def _to_jsonable(obj):
+    """Helper: Convert a stage result into a JSON-ready blob."""
+    if isinstance(obj, BaseModel):
+        # serialized by pydantic-core at flush time, no intermediate dict
+        return obj
+    elif hasattr(obj, "dict"):
+        return obj.dict()
+    elif hasattr(obj, "__dict__"):
+        return obj.__dict__
+    return str(obj)
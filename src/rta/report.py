@@ -0,0 +1,26 @@
+"""
+Markdown Report Rendering.
+File: src/rta/report.py
+"""
+
+from typing import Any, Tuple
+
+
+def _cluster_fields(c: Any) -> Tuple[str, str]:
+    # Robust access: reasoning clusters may be models or plain dicts
+    if isinstance(c, dict):
+        return c.get('cluster_name', c.get('name', 'Cluster')), c.get('description', '')
+    return getattr(c, 'cluster_name', getattr(c, 'name', 'Cluster')), getattr(c, 'description', '')
+
+
+def render_markdown(final_report: Any, topic: str) -> str:
+    """
+    Renders the Stage 4 result as report.md.
+    `topic` is used when the result carries no topic of its own.
+    """
+    report_topic = getattr(final_report, 'topic', topic)
+    clusters = getattr(final_report, 'clusters', [])
+    clusters_md = "".join(
+        f"## {name}\n{desc}\n\n" for name, desc in map(_cluster_fields, clusters)
+    )
+    return f"# {report_topic}\n\n{clusters_md}"
@@ -1,20 +1,27 @@
 from __future__ import annotations
 
-import json
+import os
 import re
 import time
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Dict
 
+import orjson
+from pydantic import BaseModel
+
 from .config import RTAConfig
 from .schemas import RunStatus, StageStatus
 
 
+_SLUG_STRIP = re.compile(r"[^a-z0-9\-_ ]+")
+_SLUG_WS = re.compile(r"\s+")
+
+
 def _slugify(text: str, max_len: int = 32) -> str:
-    text = text.strip().lower()
-    text = re.sub(r"[^a-z0-9\-_ ]+", "", text)
-    text = re.sub(r"\s+", "-", text)
-    return text[:max_len] if len(text) > max_len else text
+    text = _SLUG_STRIP.sub("", text.strip().lower())
+    text = _SLUG_WS.sub("-", text)
+    return text[:max_len]
 
 
 def new_run_dir(cfg: RTAConfig, query: str) -> Path:
@@ -32,21 +39,68 @@ def new_run_dir(cfg: RTAConfig, query: str) -> Path:
     return run_dir
 
 
+def _json_bytes(obj: Any) -> bytes:
+    # orjson: UTF-8 output (no ASCII escaping), indented like the old json.dump(indent=2)
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str)
+
+
 def write_json(path: Path, obj: Any) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    path.write_bytes(_json_bytes(obj))
 
 
 def init_status(run_dir: Path) -> RunStatus:
     status = RunStatus(run_id=run_dir.name, stages=StageStatus())
-    write_json(run_dir / "status.json", status.model_dump())
+    update_status(run_dir, status)
     return status
 
 
 def update_status(run_dir: Path, status: RunStatus) -> None:
-    write_json(run_dir / "status.json", status.model_dump())
+    # machine-readable state: compact, and swapped in atomically so a reader
+    # tailing the run directory never sees a half-written file
+    tmp = run_dir / ".status.tmp"
+    tmp.write_bytes(orjson.dumps(status.model_dump(), default=str))
+    os.replace(tmp, run_dir / "status.json")
 
 
 def write_report_md(run_dir: Path, report_md: str) -> None:
     (run_dir / "report.md").write_text(report_md, encoding="utf-8")
+
+
+def _write_bytes(path: Path, data: bytes) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+@dataclass
+class RunArtifacts:
+    """
+    In-memory staging area for a run's output files.
+
+    Stages hand their results over as they finish; flush() writes every file
+    exactly once at the end of the run (one open/write/close per file), so
+    short runs do not pay for repeated rewrites of the same artifacts.
+    str blobs are written as UTF-8 text, pydantic models via model_dump_json,
+    anything else as indented JSON.
+    """
+    blobs: Dict[str, Any] = field(default_factory=dict)
+
+    def stage(self, filename: str, obj: Any) -> None:
+        self.blobs[filename] = obj
+
+    def flush(self, run_dir: Path) -> None:
+        run_dir.mkdir(parents=True, exist_ok=True)
+        for filename, obj in self.blobs.items():
+            if isinstance(obj, str):
+                data = obj.encode("utf-8")
+            elif isinstance(obj, BaseModel):
+                data = obj.model_dump_json(indent=2).encode("utf-8")
+            else:
+                data = _json_bytes(obj)
+            _write_bytes(run_dir / filename, data)
+        self.blobs.clear()
@@ -23,10 +23,6 @@ from .reasoning import (
     ReasoningResult,
 )
 
-
-FinalOutput.model_rebuild()
-TopicStructuringResult.model_rebuild()
-
 __all__ = [
     "InputPayload",
     "QueryPlan",
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
+
+import orjson
 from pydantic import BaseModel, Field
 
+from .reasoning import ReasoningResult
+
 # ---------- Stage 0: Input ----------
 class InputPayload(BaseModel):
     query: str
@@ -61,20 +66,39 @@ class FinalOutput(BaseModel):
     query: str
     main_directions: List[str]
     recommended_pipeline: List[str]
-    clusters: List["TopicCluster"]
-    top_papers: List["PaperItem"]
-    reasoning: Optional["ReasoningResult"] = None
+    clusters: List[TopicCluster]
+    top_papers: List[PaperItem]
+    reasoning: Optional[ReasoningResult] = None
 
 
 # ---------- Run status ----------
-class StageStatus(BaseModel):
+# Internal, mutated after every stage: plain slotted dataclasses, so attribute
+# writes are slot stores instead of a trip through BaseModel.__setattr__.
+# model_dump()/model_dump_json() keep the pydantic-style call sites working.
+@dataclass(slots=True)
+class StageStatus:
     stage1: str = "pending"
     stage2: str = "pending"
     stage3: str = "pending"
     stage4: str = "pending"
 
+    def model_dump(self) -> Dict[str, Any]:
+        # explicit dict: dataclasses.asdict() recurses and deep-copies, ~10x slower
+        return {"stage1": self.stage1, "stage2": self.stage2, "stage3": self.stage3, "stage4": self.stage4}
+
 
-class RunStatus(BaseModel):
+@dataclass(slots=True)
+class RunStatus:
     run_id: str
-    stages: StageStatus = Field(default_factory=StageStatus)
+    stages: StageStatus = field(default_factory=StageStatus)
     error: Optional[Dict[str, Any]] = None
+
+    def model_dump(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "stages": self.stages.model_dump(),
+            "error": dict(self.error) if self.error is not None else None,
+        }
+
+    def model_dump_json(self) -> str:
+        return orjson.dumps(self.model_dump(), default=str).decode("utf-8")
@@ -1,10 +1,4 @@
-from pydantic import BaseModel
-from typing import List
+# Import path kept for the stage modules; the model lives in core.
+from .core import QueryPlan
 
-
-class QueryPlan(BaseModel):
-    expanded_queries: List[str]
-    must_include: List[str]
-    exclude: List[str]
-    target_subtasks: List[str]
-    notes: str
+__all__ = ["QueryPlan"]
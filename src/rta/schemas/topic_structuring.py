@@ -1,16 +1,4 @@
-from pydantic import BaseModel
-from typing import List
+# Import path kept for the stage modules; the models live in core.
+from .core import TopicCluster, TopicStructuringResult
 
-
-class TopicCluster(BaseModel):
-    cluster_id: str
-    name: str
-    description: str
-    keywords: List[str]
-    typical_methods: List[str]
-
-
-class TopicStructuringResult(BaseModel):
-    main_directions: List[str]
-    recommended_pipeline: List[str]
-    clusters: List[TopicCluster]
+__all__ = ["TopicCluster", "TopicStructuringResult"]
@@ -1,23 +1,26 @@
 from __future__ import annotations
 
-import json
+import datetime
+import functools
 import os
-import pydoc
 import html
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from prompt_toolkit import PromptSession
 from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.completion import WordCompleter
-from prompt_toolkit.formatted_text import HTML
-from prompt_toolkit.history import FileHistory
+from prompt_toolkit.completion import CompleteEvent, Completer, Completion
+from prompt_toolkit.document import Document
+from prompt_toolkit.formatted_text import HTML, FormattedText
+from prompt_toolkit.history import FileHistory, InMemoryHistory
 from prompt_toolkit.shortcuts import print_formatted_text
 from prompt_toolkit.styles import Style
+from pydantic import ValidationError
 
 from .config import RTAConfig
-from .pipeline import run_pipeline
-from .schemas import InputPayload
 
 RTA_BANNER = r"""
 ██████╗ ████████╗ █████╗
@@ -30,47 +33,190 @@ RTA_BANNER = r"""
     "\n"
 )
 
+# Static markup is parsed once at import, not on every draw
+_BANNER_HTML = HTML(f"\n<banner>{RTA_BANNER}</banner>")
+_RULE = "─" * 60
+_HR_HTML = HTML(f"<dim>{_RULE}</dim>")
+_EMPTY_TIP_HTML = HTML(
+    "<dim>Tip: /run &lt;topic&gt;  |  /set retrieval_mode mock  |  /open report  |  /help</dim>"
+)
+_CHAT_PROMPT = FormattedText([("bold ansiblue", "\n(You) > ")])
+
+
+_HTML_SPECIAL = frozenset("&<>\"'")
+
+
+@functools.lru_cache(maxsize=256)
+def _make_html(tag: str, msg: str) -> HTML:
+    # Most messages are constants ("[WARN] No runs yet...", tips), so the
+    # escape + parse is memoized; dynamic ones (topic, run_dir) just miss.
+    safe = msg if _HTML_SPECIAL.isdisjoint(msg) else html.escape(msg)
+    return HTML(f"<{tag}>{safe}</{tag}>")
+
 
 def _print(style: Style, tag: str, msg: str) -> None:
-    safe = html.escape(msg)
-    print_formatted_text(HTML(f"<{tag}>{safe}</{tag}>"), style=style)
+    print_formatted_text(_make_html(tag, msg), style=style)
 
 
-def _print_kv(style: Style, key: str, value: str) -> None:
-    import html as _html
+def _kv_html(key: str, value: str) -> str:
+    return f"<dim>{html.escape(key)}</dim> {html.escape(value)}"
+
 
-    k = _html.escape(key)
-    v = _html.escape(value)
-    print_formatted_text(HTML(f"<dim>{k}</dim> {v}"), style=style)
+def _print_kv(style: Style, key: str, value: str) -> None:
+    print_formatted_text(HTML(_kv_html(key, value)), style=style)
+
+
+# /help is static: escape and parse it once, print it with a single write.
+_HELP_HTML = HTML(
+    "\n".join(
+        [
+            "<title>Commands</title>",
+            _kv_html("/run <topic>", "Run once (plain text also works)"),
+            _kv_html("/set <key> <value>", "Set config for this session"),
+            _kv_html("  keys", "max_papers, min_year, max_year, retrieval_mode, sources"),
+            _kv_html("  retrieval_mode", "mock | live"),
+            _kv_html("  sources", "both | arxiv | s2"),
+            _kv_html(
+                "/show <what>",
+                "Print JSON (trimmed): config|plan|retrieval|status|reasoning",
+            ),
+            _kv_html(
+                "/open <what>",
+                "View file in CLI pager: report|plan|retrieval|status|reasoning",
+            ),
+            _kv_html("/last", "Show last run directory"),
+            _kv_html("/clear-cache", "Forget cached query plans"),
+            _kv_html("/exit", "Quit"),
+        ]
+    )
+)
 
 
 def _hr(style: Style) -> None:
-    print_formatted_text(
-        HTML("<dim>────────────────────────────────────────────────────────────</dim>"),
-        style=style,
-    )
+    print_formatted_text(_HR_HTML, style=style)
+
+
+class _PrefixCompleter(Completer):
+    """
+    Case-insensitive word completer over a fixed vocabulary.
+
+    Same matches and order as WordCompleter(ignore_case=True), but the
+    completions for every prefix are precomputed once (a trie flattened into
+    one dict), so a keypress is a single lookup instead of a scan of the
+    whole word list.
+    """
+
+    def __init__(self, words: Sequence[str]) -> None:
+        table: Dict[str, List[str]] = {}
+        for w in words:
+            low = w.lower()
+            for i in range(len(low) + 1):
+                table.setdefault(low[:i], []).append(w)
+        self._by_prefix: Dict[str, Tuple[str, ...]] = {k: tuple(v) for k, v in table.items()}
+
+    def get_completions(
+        self, document: Document, complete_event: CompleteEvent
+    ) -> Iterable[Completion]:
+        prefix = document.get_word_before_cursor()
+        start = -len(prefix)
+        for w in self._by_prefix.get(prefix.lower(), ()):
+            yield Completion(w, start_position=start)
+
+
+class _BufferedFileHistory(FileHistory):
+    """
+    FileHistory that keeps the disk off the Enter path.
+
+    store_string only formats the entry and queues it; a daemon thread appends
+    queued entries in batches (one open + write per batch, no fsync). commit()
+    writes whatever is still pending and must run before the shell exits.
+    The on-disk format is FileHistory's, so existing history files still load.
+    """
+
+    FLUSH_INTERVAL_S = 1.0
+
+    def __init__(self, filename: str) -> None:
+        super().__init__(filename)
+        self._pending: List[bytes] = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def store_string(self, string: str) -> None:
+        entry = f"\n# {datetime.datetime.now()}\n" + "".join(
+            f"+{line}\n" for line in string.split("\n")
+        )
+        with self._lock:
+            self._pending.append(entry.encode("utf-8"))
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="rta-history", daemon=True
+                )
+                self._writer.start()
+        self._wake.set()
+
+    def _write_loop(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.FLUSH_INTERVAL_S)  # let a few entries pile up
+            self.commit()
+
+    def commit(self) -> None:
+        # io_lock first, so batches hit the file in the order they were taken
+        with self._io_lock:
+            with self._lock:
+                chunks, self._pending = self._pending, []
+                self._wake.clear()
+            if chunks:
+                with open(self.filename, "ab") as f:
+                    f.write(b"".join(chunks))
 
 
 def _has_gemini_key() -> bool:
     return bool(os.getenv("GEMINI_API_KEY", "").strip())
 
 
+# /show prints at most this many characters of a file
+_SHOW_MAX_CHARS = 6000
+
+
 def _find_latest_run_dir(runs_dir: str) -> Optional[Path]:
-    p = Path(runs_dir)
-    if not p.exists():
-        return None
-    dirs = [d for d in p.iterdir() if d.is_dir()]
-    if not dirs:
+    # scandir: is_dir() comes from the dirent type, so only the mtime needs a
+    # stat; single pass, only the newest directory is kept
+    best: Optional[str] = None
+    best_mtime = float("-inf")
+    try:
+        with os.scandir(runs_dir) as it:
+            for entry in it:
+                if not entry.is_dir():
+                    continue
+                mtime = entry.stat().st_mtime
+                if mtime > best_mtime:
+                    best, best_mtime = entry.path, mtime
+    except FileNotFoundError:
         return None
-    dirs.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-    return dirs[0]
+    return Path(best) if best is not None else None
 
 
 class RTAShell:
+    # /show and /open targets -> run artifact filename (static, built once)
+    _SHOW_FILES = MappingProxyType(
+        {
+            "plan": "plan.json",  # [FIX] aligned filename
+            "retrieval": "retrieval.json",
+            "status": "structuring.json",  # [FIX] aligned filename
+            "reasoning": "reasoning.json",
+        }
+    )
+    _OPEN_FILES = MappingProxyType({"report": "report.md", **_SHOW_FILES})  # [FIX] aligned filename
+
     def __init__(self, cfg: Optional[RTAConfig] = None):
         self.cfg = cfg or RTAConfig()
         self.last_run_dir: Optional[Path] = None
-        self.sources = os.getenv("RTA_SOURCES", "both").lower()  # both|arxiv|s2
+        # (cfg it was rendered from, text): cfg is frozen and /set swaps in a
+        # new object, so an identity check is the invalidation
+        self._config_json_cache: Optional[Tuple[RTAConfig, str]] = None
 
         self.style = Style.from_dict(
             {
@@ -85,10 +231,7 @@ class RTAShell:
             }
         )
 
-        hist_path = Path(self.cfg.runs_dir) / ".rta_history"
-        hist_path.parent.mkdir(parents=True, exist_ok=True)
-
-        self._completer = WordCompleter(
+        self._completer = _PrefixCompleter(
             [
                 "/help",
                 "/run",
@@ -96,6 +239,7 @@ class RTAShell:
                 "/show",
                 "/open",
                 "/last",
+                "/clear-cache",
                 "/exit",
                 "max_papers",
                 "min_year",
@@ -111,20 +255,46 @@ class RTAShell:
                 "status",
                 "report",
                 "reasoning",
-            ],
-            ignore_case=True,
+            ]
         )
 
+        # History file + prompt session are created by run(): constructing the
+        # shell has no filesystem side effects
+        self._history: Optional[_BufferedFileHistory] = None
+        self._session: Optional[PromptSession] = None
+
+        self._warned_missing_key = False
+
+        # /command -> (handler(rest) or None, exits shell); one lookup per command
+        self._dispatch: Dict[str, Tuple[Optional[Callable[[str], None]], bool]] = {
+            "exit": (None, True),
+            "quit": (None, True),
+            "help": (lambda rest: self._cmd_help(), False),
+            "run": (self._cmd_run_args, False),
+            "set": (self._cmd_set, False),
+            "show": (self._cmd_show, False),
+            "open": (self._cmd_open, False),
+            "last": (lambda rest: self._cmd_last(), False),
+            "clear-cache": (lambda rest: self._cmd_clear_cache(), False),
+        }
+
+    def run(self) -> None:
+        hist_path = Path(self.cfg.runs_dir) / ".rta_history"
+        hist_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._history = _BufferedFileHistory(str(hist_path))
         self._session = PromptSession(
-            history=FileHistory(str(hist_path)),
+            history=self._history,
             auto_suggest=AutoSuggestFromHistory(),
             completer=self._completer,
         )
+        try:
+            self._repl()
+        finally:
+            self._history.commit()
 
-        self._warned_missing_key = False
-
-    def run(self) -> None:
-        print_formatted_text(HTML(f"\n<banner>{RTA_BANNER}</banner>"), style=self.style)
+    def _repl(self) -> None:
+        print_formatted_text(_BANNER_HTML, style=self.style)
         _print(self.style, "title", "Research Thinking Agent")
         _print(
             self.style, "hint", "Type /help for commands. Use /run <topic> to start.\n"
@@ -153,11 +323,7 @@ class RTAShell:
                 return
 
             if not line:
-                _print(
-                    self.style,
-                    "dim",
-                    "Tip: /run <topic>  |  /set retrieval_mode mock  |  /open report  |  /help",
-                )
+                print_formatted_text(_EMPTY_TIP_HTML, style=self.style)
                 continue
 
             if line.startswith("/"):
@@ -169,68 +335,30 @@ class RTAShell:
             self._cmd_run(line)
 
     def _handle_command(self, line: str) -> bool:
-        parts = line[1:].strip().split()
+        # "/cmd rest of line": split once, handlers get the untokenized tail
+        parts = line[1:].split(None, 1)
         cmd = parts[0].lower() if parts else ""
-        args = parts[1:]
-
-        if cmd in ("exit", "quit"):
-            return True
+        rest = parts[1].strip() if len(parts) > 1 else ""
 
-        if cmd == "help":
-            self._cmd_help()
+        entry = self._dispatch.get(cmd)
+        if entry is None:
+            _print(self.style, "err", f"[ERR] Unknown command: /{cmd}. Try /help")
             return False
 
-        if cmd == "run":
-            topic = " ".join(args).strip()
-            if not topic:
-                _print(self.style, "err", "[ERR] Usage: /run <topic>")
-            else:
-                self._cmd_run(topic)
-            return False
+        handler, should_exit = entry
+        if handler is not None:
+            handler(rest)
+        return should_exit
 
-        if cmd == "set":
-            self._cmd_set(args)
-            return False
-
-        if cmd == "show":
-            self._cmd_show(args)
-            return False
-
-        if cmd == "open":
-            self._cmd_open(args)
-            return False
-
-        if cmd == "last":
-            self._cmd_last()
-            return False
-
-        _print(self.style, "err", f"[ERR] Unknown command: /{cmd}. Try /help")
-        return False
+    def _cmd_run_args(self, topic: str) -> None:
+        if not topic:
+            _print(self.style, "err", "[ERR] Usage: /run <topic>")
+            return
+        self._cmd_run(topic)
 
     def _cmd_help(self) -> None:
         _hr(self.style)
-        _print(self.style, "title", "Commands")
-        _print_kv(self.style, "/run <topic>", "Run once (plain text also works)")
-        _print_kv(self.style, "/set <key> <value>", "Set config for this session")
-        _print_kv(
-            self.style,
-            "  keys",
-            "max_papers, min_year, max_year, retrieval_mode, sources",
-        )
-        _print_kv(self.style, "  retrieval_mode", "mock | live")
-        _print_kv(self.style, "  sources", "both | arxiv | s2")
-        _print_kv(
-            self.style,
-            "/show <what>",
-            "Print JSON (trimmed): config|plan|retrieval|status|reasoning",
-        )
-        _print_kv(
-            self.style,
-            "/open <what>",
-            "View file in CLI pager: report|plan|retrieval|status|reasoning",
-        )
-        _print_kv(self.style, "/last", "Show last run directory")
-        _print_kv(self.style, "/exit", "Quit")
+        print_formatted_text(_HELP_HTML, style=self.style)
         _hr(self.style)
 
     def _cmd_last(self) -> None:
@@ -239,17 +367,24 @@ class RTAShell:
             return
         _print(self.style, "ok", f"[OK] Last run: {self.last_run_dir}")
 
-    def _cmd_set(self, args) -> None:
-        if len(args) < 2:
+    def _cmd_clear_cache(self) -> None:
+        from .stages.query_plan_gemini import clear_plan_cache
+
+        clear_plan_cache()
+        _print(self.style, "ok", "[OK] Query plan cache cleared.")
+
+    def _cmd_set(self, rest: str) -> None:
+        parts = rest.split(None, 1)
+        if len(parts) < 2:
             _print(self.style, "err", "[ERR] Usage: /set <key> <value>")
             return
 
-        key = args[0].lower()
-        value = " ".join(args[1:]).strip()
+        key = parts[0].lower()
+        value = parts[1]
 
         try:
             if key in ("max_papers", "min_year", "max_year", "cache_ttl_hours"):
-                setattr(self.cfg, key, int(value))
+                self.cfg = self.cfg.model_copy(update={key: int(value)})
                 _print(self.style, "ok", f"[OK] Set {key} = {value}")
                 return
 
@@ -257,15 +392,17 @@ class RTAShell:
                 v = value.lower()
                 if v not in ("mock", "live"):
                     raise ValueError("retrieval_mode must be: mock|live")
-                setattr(self.cfg, key, v)
+                self.cfg = self.cfg.model_copy(update={key: v})
                 _print(self.style, "ok", f"[OK] Set {key} = {v}")
                 return
 
             if key == "sources":
                 v = value.lower()
-                if v not in ("both", "arxiv", "s2"):
-                    raise ValueError("sources must be: both|arxiv|s2")
-                self.sources = v
+                # validated by RTAConfig (model_copy would skip the check)
+                try:
+                    self.cfg = RTAConfig.model_validate({**self.cfg.model_dump(), "sources": v})
+                except ValidationError:
+                    raise ValueError("sources must be: both|arxiv|s2") from None
                 _print(self.style, "ok", f"[OK] Set sources = {v}")
                 return
 
@@ -274,8 +411,8 @@ class RTAShell:
         except Exception as e:
             _print(self.style, "err", f"[ERR] {e}")
 
-    def _cmd_show(self, args) -> None:
-        if not args:
+    def _cmd_show(self, rest: str) -> None:
+        if not rest:
             _print(
                 self.style,
                 "err",
@@ -283,25 +420,22 @@ class RTAShell:
             )
             return
 
-        what = args[0].lower()
+        what = rest.split(None, 1)[0].lower()
 
         if what == "config":
-            cfg_obj = self.cfg.model_dump()
-            cfg_obj["sources"] = self.sources
-            print(json.dumps(cfg_obj, ensure_ascii=False, indent=2))
+            cached = self._config_json_cache
+            if cached is None or cached[0] is not self.cfg:
+                # pydantic-core serializes straight to JSON, no dict round-trip
+                cached = (self.cfg, self.cfg.model_dump_json(indent=2))
+                self._config_json_cache = cached
+            print(cached[1])
             return
 
         if not self.last_run_dir:
             _print(self.style, "warn", "[WARN] No runs yet. Use /run <topic>.")
             return
 
-        mapping = {
-            "plan": "plan.json",  # [FIX] aligned filename
-            "retrieval": "retrieval.json",
-            "status": "structuring.json",  # [FIX] aligned filename
-            "reasoning": "reasoning.json",
-        }
-        fname = mapping.get(what)
+        fname = self._SHOW_FILES.get(what)
         if not fname:
             _print(
                 self.style,
@@ -315,13 +449,17 @@ class RTAShell:
             _print(self.style, "warn", f"[WARN] File not found: {p}")
             return
 
-        txt = p.read_text(encoding="utf-8", errors="replace")
-        if len(txt) > 6000:
-            txt = txt[:6000] + "\n...\n"
+        # Bounded read: UTF-8 is at most 4 bytes/char, so this window always
+        # holds the first 6000 chars (+1 to detect truncation) of any file.
+        with p.open("rb") as f:
+            raw = f.read(4 * (_SHOW_MAX_CHARS + 1))
+        txt = raw.decode("utf-8", errors="replace")
+        if len(txt) > _SHOW_MAX_CHARS:
+            txt = txt[:_SHOW_MAX_CHARS] + "\n...\n"
         print(txt)
 
-    def _cmd_open(self, args) -> None:
-        if not args:
+    def _cmd_open(self, rest: str) -> None:
+        if not rest:
             _print(
                 self.style,
                 "err",
@@ -329,20 +467,13 @@ class RTAShell:
             )
             return
 
-        what = args[0].lower()
+        what = rest.split(None, 1)[0].lower()
 
         if not self.last_run_dir:
             _print(self.style, "warn", "[WARN] No runs yet. Use /run <topic>.")
             return
 
-        mapping = {
-            "report": "report.md",  # [FIX] aligned filename
-            "plan": "plan.json",  # [FIX] aligned filename
-            "retrieval": "retrieval.json",
-            "status": "structuring.json",  # [FIX] aligned filename
-            "reasoning": "reasoning.json",
-        }
-        fname = mapping.get(what)
+        fname = self._OPEN_FILES.get(what)
         if not fname:
             _print(
                 self.style,
@@ -356,6 +487,8 @@ class RTAShell:
             _print(self.style, "warn", f"[WARN] File not found: {p}")
             return
 
+        import pydoc
+
         txt = p.read_text(encoding="utf-8", errors="replace")
         pydoc.pager(txt)
 
@@ -392,12 +525,17 @@ class RTAShell:
             f"2. Be concise but insightful.\n"
             f"3. Proactively suggest applications (e.g., if relevant, mention LVEF, clinical integration, etc.)."
         )
+        # Constant across turns: build it once, each turn only appends its own text
+        prompt_prefix = f"{system_context}\n\nUser: "
+
+        # Line editing + Up-arrow recall of this chat's questions (kept out of
+        # the command history file)
+        chat_session = PromptSession(history=InMemoryHistory())
 
         # Chat Loop
         while True:
             try:
-                # Use standard input for simplicity in this mode
-                user_input = console.input("\n[bold blue](You) > [/bold blue]").strip()
+                user_input = chat_session.prompt(_CHAT_PROMPT).strip()
 
                 if user_input.lower() in ["exit", "quit"]:
                     console.print("[yellow]Exiting chat mode.[/yellow]")
@@ -410,14 +548,14 @@ class RTAShell:
                     "[bold blue]RTA is thinking...[/bold blue]", spinner="dots"
                 ):
                     # Construct prompt
-                    prompt = f"{system_context}\n\n" f"User: {user_input}\n" f"RTA:"
+                    prompt = f"{prompt_prefix}{user_input}\nRTA:"
                     # Call LLM
                     response = client.generate_text(prompt)
 
                 # Print response nicely
                 console.print(f"\n[bold cyan](RTA)[/bold cyan]: {response}")
 
-            except KeyboardInterrupt:
+            except (EOFError, KeyboardInterrupt):
                 console.print("\n[yellow]Interrupted. Exiting chat mode.[/yellow]")
                 break
             except Exception as e:
@@ -425,16 +563,24 @@ class RTAShell:
                 break
 
     def _cmd_run(self, topic: str) -> None:
-        _hr(self.style)
-        _print(self.style, "title", f"Topic: {topic}")
-        _print(
-            self.style,
-            "dim",
-            f"Config: max_papers={self.cfg.max_papers}, mode={self.cfg.retrieval_mode}, sources={self.sources}",
+        # One write for the whole header (plain fragments: no markup to escape)
+        print_formatted_text(
+            FormattedText(
+                [
+                    ("class:dim", f"{_RULE}\n"),
+                    ("class:title", f"Topic: {topic}\n"),
+                    (
+                        "class:dim",
+                        f"Config: max_papers={self.cfg.max_papers}, mode={self.cfg.retrieval_mode}, sources={self.cfg.sources}\n",
+                    ),
+                    ("class:dim", _RULE),
+                ]
+            ),
+            style=self.style,
         )
-        _hr(self.style)
 
-        os.environ["RTA_SOURCES"] = self.sources
+        # Deferred: pulls in the whole stage stack, which only a run needs
+        from .pipeline import run_pipeline
 
         try:
             # [FIX] Correct function call matching the latest pipeline.py
@@ -443,11 +589,14 @@ class RTAShell:
             self.last_run_dir = Path(run_dir)
 
             if success:
-                _print(self.style, "ok", f"[OK] Saved outputs: {run_dir}")
-                _print(
-                    self.style,
-                    "dim",
-                    "Try: /show retrieval  |  /show status  |  /open report  |  /last",
+                print_formatted_text(
+                    FormattedText(
+                        [
+                            ("class:ok", f"[OK] Saved outputs: {run_dir}\n"),
+                            ("class:dim", "Try: /show retrieval  |  /show status  |  /open report  |  /last"),
+                        ]
+                    ),
+                    style=self.style,
                 )
                 # [NEW] Enter chat mode automatically
                 self._enter_chat_mode(topic, run_dir)
@@ -6,29 +6,25 @@ Includes robust JSON parsing, sanitization, and LLM-based self-repair.
 File: src/rta/stages/query_plan_gemini.py
 """
 
-import json
+import functools
 import re
 import logging
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Any
+
+import orjson
 
-# --- Imports from Project Structure ---
 try:
-    from rta.schemas.query_plan import QueryPlan
-    # We use the unified client factory we created earlier
-    from rta.utils.llm_client import get_default_client
+    import json_repair
+    HAS_JSON_REPAIR = True
 except ImportError:
-    # Fallback definitions to prevent ImportErrors during CLI startup
-    from pydantic import BaseModel
-    class QueryPlan(BaseModel):
-        original_topic: str
-        expanded_queries: List[str]
-        must_include: List[str] = []
-        exclude: List[str] = []
-        target_subtasks: List[str] = []
-        notes: str = ""
-    
-    def get_default_client():
-        raise ImportError("rta.utils.llm_client not found")
+    HAS_JSON_REPAIR = False
+
+# --- Imports from Project Structure ---
+from rta.schemas.query_plan import QueryPlan
+# We use the unified client factory we created earlier
+from rta.utils.llm_client import get_default_client
+from rta.utils.json_extract import read_until_object_closes
 
 logger = logging.getLogger(__name__)
 
@@ -52,8 +48,30 @@ _SCHEMA_HINT = """{
   "notes": "string"
 }"""
 
+# Everything but the topic is constant: pre-join it once (plain
+# concatenation, since the schema hint is full of braces) and put the topic
+# last, so every plan request shares one prefix for implicit prompt caching.
+_PLAN_PROMPT_HEAD = (
+    f"{_SYSTEM_PROMPT}\n"
+    "Requirements:\n"
+    "- expanded_queries: exactly 12 (short strings)\n"
+    "- must_include: 3-6 items\n"
+    "- exclude: 0-6 items\n"
+    "- target_subtasks: 5-8 items\n"
+    "- notes: 1-2 short sentences\n"
+    "Return ONLY JSON.\n\n"
+    f"Expected Format:\n{_SCHEMA_HINT}\n\n"
+    "Topic: "
+)
+_REPAIR_PROMPT_HEAD = "You fix broken JSON. Return ONLY valid JSON.\n\nBroken JSON:\n"
+_REPAIR_PROMPT_TAIL = f"\n\nSchema Hint:\n{_SCHEMA_HINT}"
+
 # --- Robust JSON Helper Functions ---
 
+_FENCE_HEAD = re.compile(r"^```(?:json)?\s*", re.IGNORECASE)
+_FENCE_TAIL = re.compile(r"\s*```$")
+
+
 def _extract_json_block(text: str) -> str:
     """
     Try to extract a JSON object from model output.
@@ -61,8 +79,8 @@ def _extract_json_block(text: str) -> str:
     t = text.strip()
     # Strip common code fences
     if t.startswith("```"):
-        t = re.sub(r"^```(?:json)?\s*", "", t, flags=re.IGNORECASE)
-        t = re.sub(r"\s*```$", "", t)
+        t = _FENCE_HEAD.sub("", t)
+        t = _FENCE_TAIL.sub("", t)
     # If it's already a JSON object, return it
     if t.startswith("{") and t.endswith("}"):
         return t
@@ -74,41 +92,38 @@ def _extract_json_block(text: str) -> str:
     return t
 
 
+# One JSON string literal: quote, then plain runs and backslash escapes, then
+# the closing quote (optional, so an unterminated tail still counts).
+_JSON_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"?', re.DOTALL)
+_ESCAPE_OR_NEWLINE = re.compile(r"\\.|\n", re.DOTALL)
+
+
+def _escape_newline(m: "re.Match[str]") -> str:
+    tok = m.group(0)
+    # an escape sequence (even a backslash-newline) is kept verbatim
+    return "\\n" if tok == "\n" else tok
+
+
+def _escape_string_newlines(m: "re.Match[str]") -> str:
+    tok = m.group(0)
+    if "\n" not in tok:
+        return tok
+    return _ESCAPE_OR_NEWLINE.sub(_escape_newline, tok)
+
+
 def _sanitize_json_text(s: str) -> str:
     """
     Make JSON parsing more robust.
     """
     s = s.lstrip("\ufeff").strip()
-    s = s.replace("\r\n", "\n").replace("\r", "\n")
-    # Simple escape logic
-    out = []
-    in_string = False
-    escape = False
-    for ch in s:
-        if in_string:
-            if escape:
-                out.append(ch)
-                escape = False
-                continue
-            if ch == "\\":
-                out.append(ch)
-                escape = True
-                continue
-            if ch == '"':
-                out.append(ch)
-                in_string = False
-                continue
-            if ch == "\n":
-                out.append("\\n")
-                continue
-            out.append(ch)
-        else:
-            if ch == '"':
-                out.append(ch)
-                in_string = True
-            else:
-                out.append(ch)
-    return "".join(out).strip()
+    # one fast scan; well-formed model output rarely carries any CR
+    if "\r" in s:
+        s = s.replace("\r\n", "\n").replace("\r", "\n")
+    # The only rewrite is escaping raw newlines inside strings
+    if "\n" not in s or '"' not in s:
+        return s.strip()
+    # The regex engine walks the text; Python only runs per string literal
+    return _JSON_STRING.sub(_escape_string_newlines, s).strip()
 
 
 def _repair_json_via_llm(client: Any, broken_json: str) -> str:
@@ -116,11 +131,7 @@ def _repair_json_via_llm(client: Any, broken_json: str) -> str:
     Self-Correction Mechanism.
     """
     logger.info("[QueryPlan] Attempting to repair broken JSON via LLM...")
-    prompt = (
-        f"You fix broken JSON. Return ONLY valid JSON.\n\n"
-        f"Broken JSON:\n{broken_json}\n\n"
-        f"Schema Hint:\n{_SCHEMA_HINT}"
-    )
+    prompt = f"{_REPAIR_PROMPT_HEAD}{broken_json}{_REPAIR_PROMPT_TAIL}"
     try:
         raw_repaired = client.generate_text(prompt)
         return raw_repaired
@@ -129,57 +140,139 @@ def _repair_json_via_llm(client: Any, broken_json: str) -> str:
         return broken_json
 
 
+def _repair_json_locally(raw_text: str, topic: str) -> Optional[Dict[str, Any]]:
+    """
+    Fix the usual LLM JSON slips (trailing commas, unclosed brackets/strings)
+    offline with json_repair before paying for an LLM round-trip. Only a
+    result that validates as a QueryPlan is accepted; a truncated object that
+    lost required fields still goes to the LLM repair.
+    """
+    if not HAS_JSON_REPAIR:
+        return None
+    # we already know the text does not parse, so skip json_repair's own check
+    obj = json_repair.repair_json(raw_text, skip_json_loads=True, return_objects=True)
+    if not isinstance(obj, dict) or not obj:
+        return None
+    obj.setdefault("original_topic", topic)
+    try:
+        QueryPlan.model_validate(obj)
+    except Exception:
+        return None
+    return obj
+
+
+# Repair calls issued at once when the first parse fails
+_REPAIR_ATTEMPTS = 2
+
+
+def _repair_and_parse(client: Any, broken_json: str, attempt: int) -> Any:
+    repaired_text = _repair_json_via_llm(client, broken_json)
+    obj = orjson.loads(_sanitize_json_text(_extract_json_block(repaired_text)))
+    logger.info(f"[QueryPlan] JSON repaired successfully (attempt {attempt}).")
+    return obj
+
+
+def _repair_concurrently(client: Any, broken_json: str) -> Optional[Any]:
+    """
+    Run the repair round-trips in parallel and keep the first one that
+    parses, so needing a second try costs ~1 LLM round-trip instead of 2.
+    """
+    pool = ThreadPoolExecutor(max_workers=_REPAIR_ATTEMPTS, thread_name_prefix="qp-repair")
+    futures = [
+        pool.submit(_repair_and_parse, client, broken_json, attempt)
+        for attempt in range(2, 2 + _REPAIR_ATTEMPTS)
+    ]
+    try:
+        for fut in as_completed(futures):
+            try:
+                return fut.result()
+            except orjson.JSONDecodeError as e:
+                logger.warning(f"[QueryPlan] Repair failed: {e}")
+    finally:
+        # do not wait for a slower twin once one attempt has parsed
+        pool.shutdown(wait=False, cancel_futures=True)
+    return None
+
+
 # --- Main Execution Logic ---
 
+# Plans kept in-process, keyed by topic (repeat /run <topic> in one session)
+_PLAN_CACHE_SIZE = 128
+
+
+class _NoPlan(Exception):
+    """Raised instead of returning, so lru_cache never stores a fallback plan."""
+
+
+def clear_plan_cache() -> None:
+    _plan_json.cache_clear()
+
+
 def run_query_planning(topic: str) -> QueryPlan:
     """
     Executes the query planning stage using the LLM.
+    Successful plans are cached per topic; fallbacks are not.
     """
+    hits = _plan_json.cache_info().hits
+    try:
+        plan_json = _plan_json(topic)
+    except _NoPlan:
+        return _fallback_plan(topic)
+    if _plan_json.cache_info().hits > hits:
+        logger.info(f"[QueryPlan] Cache hit for topic: {topic}")
+    # a fresh model per call: callers may mutate what they get back
+    return QueryPlan.model_validate_json(plan_json)
+
+
+@functools.lru_cache(maxsize=_PLAN_CACHE_SIZE)
+def _plan_json(topic: str) -> str:
     client = get_default_client()
     
     # Build User Prompt
-    full_prompt = (
-        f"{_SYSTEM_PROMPT}\n\n"
-        f"Topic: {topic}\n\n"
-        f"Requirements:\n"
-        f"- expanded_queries: exactly 12 (short strings)\n"
-        f"- must_include: 3-6 items\n"
-        f"- exclude: 0-6 items\n"
-        f"- target_subtasks: 5-8 items\n"
-        f"- notes: 1-2 short sentences\n"
-        f"Return ONLY JSON.\n\n"
-        f"Expected Format:\n{_SCHEMA_HINT}"
-    )
+    full_prompt = f"{_PLAN_PROMPT_HEAD}{topic}"
 
     logger.info(f"[QueryPlan] Generating plan for topic: {topic}")
 
-    # 1. Generate Raw Text
+    # 1. Generate Raw Text (streamed when the client supports it)
     try:
-        raw_text = client.generate_text(full_prompt)
+        stream = getattr(client, "generate_text_stream", None)
+        if stream is not None:
+            raw_text = read_until_object_closes(stream(full_prompt))
+        else:
+            raw_text = client.generate_text(full_prompt)
     except Exception as e:
         logger.error(f"[QueryPlan] LLM generation failed: {e}")
         # If generation fails completely, raise to trigger fallback
         raw_text = ""
 
     # 2. Parse and Validate Loop
-    candidate = _sanitize_json_text(_extract_json_block(raw_text))
     obj = None
-    last_err = None
+    t = raw_text.strip()
+    if t.startswith("{") and t.endswith("}"):
+        # Clean JSON (the common case) needs no block extraction or
+        # sanitizing: text orjson accepts has no raw newlines in strings
+        try:
+            obj = orjson.loads(t)
+        except orjson.JSONDecodeError:
+            pass
+
+    candidate = ""
+    if obj is None:
+        candidate = _sanitize_json_text(_extract_json_block(raw_text))
 
     if candidate:
         try:
-            obj = json.loads(candidate)
-        except json.JSONDecodeError as e:
+            obj = orjson.loads(candidate)
+        except orjson.JSONDecodeError as e:
             logger.warning(f"[QueryPlan] JSON Parse Attempt 1 failed: {e}")
-            # Attempt Repair
-            repaired_text = _repair_json_via_llm(client, candidate)
-            repaired_candidate = _sanitize_json_text(_extract_json_block(repaired_text))
-            try:
-                obj = json.loads(repaired_candidate)
-                logger.info("[QueryPlan] JSON repaired successfully.")
-            except json.JSONDecodeError as e2:
-                last_err = e2
-                logger.warning(f"[QueryPlan] Repair failed: {e2}")
+            # Cheap offline repair first. It gets the raw text: on truncated
+            # output the extracted block is cut at an inner "}".
+            obj = _repair_json_locally(raw_text, topic)
+            if obj is not None:
+                logger.info("[QueryPlan] JSON repaired locally (json_repair).")
+            else:
+                # Attempt Repair
+                obj = _repair_concurrently(client, candidate)
 
     # 3. Validation or Fallback
     if obj:
@@ -188,10 +281,13 @@ def run_query_planning(topic: str) -> QueryPlan:
                 obj["original_topic"] = topic
             plan = QueryPlan.model_validate(obj)
             logger.info("[QueryPlan] Schema validation successful.")
-            return plan
+            return plan.model_dump_json()
         except Exception as e:
             logger.error(f"[QueryPlan] Pydantic Validation Error: {e}")
-    
+    raise _NoPlan(topic)
+
+
+def _fallback_plan(topic: str) -> QueryPlan:
     # --- FIXED FALLBACK BLOCK ---
     # This block now includes ALL required fields to prevent "Field required" errors
     logger.warning("[QueryPlan] Triggering Fallback Plan.")
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import re
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar
 
+import orjson
+from pydantic import ValidationError
+
+from ..llm.cache import result_cache_key, shared_result_cache
 from ..llm.gemini_client import GeminiClient
 from ..logger import EventLogger
 from ..schemas.reasoning import ReasoningResult
+from ..utils.json_extract import ObjectCloseDetector
 
 
 DEFAULT_SYSTEM_PROMPT = """You are a Research Reasoning Agent.
@@ -25,9 +31,9 @@ Hard rules:
 Be concise and structured.
 """
 
-DEFAULT_USER_PROMPT = """Topic: {{query}}
-
-You are given a list of academic papers in JSON: {{papers_json}}
+# Invariant instructions first, per-run data last: requests then share one
+# long prefix, which the provider's implicit prompt cache can reuse.
+DEFAULT_USER_PROMPT = """You are given a topic and a list of academic papers in JSON (below).
 
 Produce:
 1) clusters
@@ -36,11 +42,19 @@ Produce:
 4) meta
 
 Return ONLY JSON.
+
+Topic: {{query}}
+
+Papers: {{papers_json}}
 """
 
 
 # -------- JSON helpers --------
 
+_DECODER = json.JSONDecoder()
+_FENCE_HEAD = re.compile(r"^```(?:json)?\s*", re.IGNORECASE)
+_FENCE_TAIL = re.compile(r"\s*```$")
+
 def _extract_first_complete_json_object(text: str) -> str:
     """
     Extract the first complete JSON object via brace-depth matching.
@@ -50,46 +64,54 @@ def _extract_first_complete_json_object(text: str) -> str:
 
     # Remove code fences if any
     if t.startswith("```"):
-        t = re.sub(r"^```(?:json)?\s*", "", t, flags=re.IGNORECASE)
-        t = re.sub(r"\s*```$", "", t)
+        t = _FENCE_HEAD.sub("", t)
+        t = _FENCE_TAIL.sub("", t)
 
     start = t.find("{")
     if start == -1:
         return t
 
-    depth = 0
-    in_string = False
-    escape = False
-
-    for i in range(start, len(t)):
-        ch = t[i]
-
-        if in_string:
-            if escape:
-                escape = False
-                continue
-            if ch == "\\":
-                escape = True
-                continue
-            if ch == '"':
-                in_string = False
-            continue
-
-        if ch == '"':
-            in_string = True
-            continue
-        if ch == "{":
-            depth += 1
-        elif ch == "}":
-            depth -= 1
-            if depth == 0:
-                return t[start:i + 1]
+    # Well-formed object (the usual case): the C JSON scanner finds its end
+    try:
+        return t[start:_DECODER.raw_decode(t, start)[1]]
+    except ValueError:
+        pass
+
+    # Broken JSON: regex-driven brace scan (Python runs per string/brace)
+    detector = ObjectCloseDetector()
+    if detector.feed(t[start:]):
+        return t[start:start + detector.end]
 
     # not closed -> return from first "{"
     return t[start:]
 
 
-def _repair_json_via_llm(
+T = TypeVar("T")
+
+
+async def _first_in_order(aws: List[Awaitable[T]]) -> T:
+    """
+    Run awaitables concurrently; return the result of the earliest one (in list
+    order) that succeeds, without waiting on the later ones, and cancel the rest.
+    Same answer as trying them one after another, in the time of the slowest
+    failure before it. Re-raises the last error if every awaitable fails.
+    """
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    last_err: Optional[BaseException] = None
+    try:
+        for task in tasks:
+            try:
+                return await task
+            except Exception as e:
+                last_err = e
+    finally:
+        for task in tasks:
+            task.cancel()
+    assert last_err is not None
+    raise last_err
+
+
+async def _repair_json_via_llm(
     client: GeminiClient,
     logger: EventLogger,
     broken_json: str,
@@ -105,11 +127,11 @@ def _repair_json_via_llm(
         "task": "repair_json",
         "broken_json": broken_json,
     }
-    raw, meta = client.generate_json(
+    raw, meta = await client.agenerate_json(
         logger=logger,
         stage="stage4_repair",
         system=system,
-        user=json.dumps(payload, ensure_ascii=False),
+        user=orjson.dumps(payload).decode("utf-8"),
         schema_hint=schema_hint,
         temperature=0.0,
         max_output_tokens=4096,
@@ -135,8 +157,34 @@ def ensure_reasoning_prompts(prompt_dir: Path) -> None:
         pass
 
 
-def _schema_hint_reasoning() -> str:
-    return """{
+# (system prompt, user template) per prompt dir, with the files' mtimes
+_PROMPT_CACHE: Dict[Path, Tuple[Tuple[int, int], str, str]] = {}
+
+
+def _load_reasoning_prompts(prompt_dir: Path) -> Tuple[str, str]:
+    """
+    Prompt files are read once and re-read only when one of them changes;
+    a warm call costs two stat() calls.
+    """
+    system_p = prompt_dir / "reasoning_system.txt"
+    user_p = prompt_dir / "reasoning_user.txt"
+    try:
+        stamp = (system_p.stat().st_mtime_ns, user_p.stat().st_mtime_ns)
+    except FileNotFoundError:
+        ensure_reasoning_prompts(prompt_dir)
+        stamp = (system_p.stat().st_mtime_ns, user_p.stat().st_mtime_ns)
+
+    cached = _PROMPT_CACHE.get(prompt_dir)
+    if cached is not None and cached[0] == stamp:
+        return cached[1], cached[2]
+
+    system_prompt = system_p.read_text(encoding="utf-8")
+    user_tmpl = user_p.read_text(encoding="utf-8")
+    _PROMPT_CACHE[prompt_dir] = (stamp, system_prompt, user_tmpl)
+    return system_prompt, user_tmpl
+
+
+_SCHEMA_HINT_REASONING = """{
   "clusters": [
     {
       "cluster_id": "string",
@@ -172,14 +220,35 @@ def _schema_hint_reasoning() -> str:
 }"""
 
 
+# A paper enters the prompt as just what is needed to cluster and cite it;
+# authors, URLs, venue etc. would only add tokens.
+_ABSTRACT_MAX_CHARS = 500
+
+
+def _paper_for_prompt(p: Any) -> Dict[str, Any]:
+    if isinstance(p, dict):
+        get = p.get
+    else:
+        def get(name: str, default: Any = None) -> Any:
+            return getattr(p, name, default)
+    return {
+        "paper_id": get("paper_id"),
+        "title": get("title", ""),
+        "abstract": (get("abstract") or "")[:_ABSTRACT_MAX_CHARS],
+        "year": get("year"),
+    }
+
+
 def _build_user_prompt(query: str, papers: List[Dict[str, Any]], tmpl: str) -> str:
-    papers_json = json.dumps(papers, ensure_ascii=False, indent=2)
+    # compact (orjson's only layout): indentation costs tokens and tells the
+    # model nothing; non-ASCII stays as UTF-8, as with ensure_ascii=False
+    papers_json = orjson.dumps(papers).decode("utf-8")
     out = tmpl.replace("{{query}}", query)
     out = out.replace("{{papers_json}}", papers_json)
     return out
 
 
-def run_reasoning_agent(
+async def arun_reasoning_agent(
     *,
     query: str,
     papers: List[Any],
@@ -192,38 +261,43 @@ def run_reasoning_agent(
     - parse JSON strictly
     - if truncated/invalid -> repair up to 2 times
     - if still invalid -> retry with fewer papers (auto shrink)
-    """
-    ensure_reasoning_prompts(prompt_dir)
 
-    system_prompt = (prompt_dir / "reasoning_system.txt").read_text(encoding="utf-8")
-    user_tmpl = (prompt_dir / "reasoning_user.txt").read_text(encoding="utf-8")
-    schema_hint = _schema_hint_reasoning()
+    The shrink sizes run concurrently: the largest size that succeeds still
+    wins, but a failing larger size does not delay the smaller ones. Whole
+    results are cached by (query, paper-id set) in the pipeline's result cache.
+    """
+    papers_dict = [_paper_for_prompt(p) for p in papers]
 
-    client = GeminiClient.from_env()
+    result_cache = shared_result_cache()
+    paper_ids = [p["paper_id"] for p in papers_dict if p["paper_id"]]
+    result_key = result_cache_key(query, paper_ids, ReasoningResult) if paper_ids else None
+    hit = result_cache.get(result_key) if result_key else None
+    if hit is not None:
+        try:
+            result = ReasoningResult.model_validate_json(hit[0])
+            logger.log("stage4", "result_cache_hit", {"papers": len(paper_ids)})
+            return result
+        except ValidationError:
+            pass  # unreadable entry: recompute and overwrite it
 
-    def to_dict(p: Any) -> Dict[str, Any]:
-        if hasattr(p, "model_dump"):
-            return p.model_dump()
-        if isinstance(p, dict):
-            return p
-        return dict(p)
+    system_prompt, user_tmpl = _load_reasoning_prompts(prompt_dir)
+    schema_hint = _SCHEMA_HINT_REASONING
 
-    papers_dict = [to_dict(p) for p in papers]
+    client = GeminiClient.get_shared()
 
     candidate_sizes = []
     n = len(papers_dict)
     if n <= 20:
         candidate_sizes = [n]
     else:
-        candidate_sizes = [min(n, 80), min(n, 40), min(n, 20)]
+        # (deduplicated: the sizes run at once, not one after another)
+        candidate_sizes = list(dict.fromkeys([min(n, 80), min(n, 40), min(n, 20)]))
 
-    last_error: Exception | None = None
-
-    for size in candidate_sizes:
+    async def attempt_size(size: int) -> ReasoningResult:
         subset = papers_dict[:size]
         user_prompt = _build_user_prompt(query, subset, user_tmpl)
 
-        raw_text, meta = client.generate_json(
+        raw_text, meta = await client.agenerate_json(
             logger=logger,
             stage="reasoning",
             system=system_prompt,
@@ -242,16 +316,16 @@ def run_reasoning_agent(
         })
 
         if not (raw_text or "").strip():
-            last_error = RuntimeError("Stage4 returned empty response (possible quota/safety/truncation).")
-            logger.log("stage4", "json_parse_failed", {"error": str(last_error), "papers_used": size})
-            continue
+            err = RuntimeError("Stage4 returned empty response (possible quota/safety/truncation).")
+            logger.log("stage4", "json_parse_failed", {"error": str(err), "papers_used": size})
+            raise err
 
         candidate = _extract_first_complete_json_object(raw_text)
         try:
-            obj = json.loads(candidate)
-            return ReasoningResult.model_validate(obj)
-        except Exception as e:
-            last_error = e
+            # one pass: pydantic-core parses and validates without a dict in between
+            return ReasoningResult.model_validate_json(candidate)
+        except ValidationError as e:
+            last_error: Exception = e
             logger.log("stage4", "json_parse_failed", {
                 "error": str(e),
                 "papers_used": size,
@@ -262,10 +336,9 @@ def run_reasoning_agent(
         repaired_candidate = candidate
         for attempt in (1, 2):
             try:
-                repaired = _repair_json_via_llm(client, logger, repaired_candidate, schema_hint=schema_hint)
+                repaired = await _repair_json_via_llm(client, logger, repaired_candidate, schema_hint=schema_hint)
                 repaired_candidate = _extract_first_complete_json_object(repaired)
-                obj = json.loads(repaired_candidate)
-                return ReasoningResult.model_validate(obj)
+                return ReasoningResult.model_validate_json(repaired_candidate)
             except Exception as e2:
                 last_error = e2
                 logger.log("stage4", "json_repair_failed", {
@@ -275,8 +348,15 @@ def run_reasoning_agent(
                     "repaired_preview": repaired_candidate[:250],
                 })
 
-        # repair still failed -> try smaller size
+        # repair still failed -> a smaller size has to do
         logger.log("stage4", "retry_with_smaller_papers", {"from": size})
-
-    # exhausted all sizes
-    raise RuntimeError(f"Stage4 reasoning failed after retries: {last_error}")
+        raise last_error
+
+    try:
+        result = await _first_in_order([attempt_size(size) for size in candidate_sizes])
+    except Exception as last_error:
+        # exhausted all sizes
+        raise RuntimeError(f"Stage4 reasoning failed after retries: {last_error}")
+    if result_key is not None:
+        result_cache.set(result_key, result.model_dump_json(), {})
+    return result
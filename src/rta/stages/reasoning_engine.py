@@ -3,9 +3,15 @@ Reasoning Engine with Self-Refinement.
 File: src/rta/stages/reasoning_engine.py
 """
 
+import functools
 import logging
-from typing import Any, Optional
-import json
+from typing import Any, List, Optional, Tuple
+
+import orjson
+from pydantic import ValidationError, create_model
+
+from rta.llm.cache import result_cache_key
+from rta.llm.plan_cache import result_skeleton, topic_keywords
 
 # Schemas imports (trusted from pipeline injection)
 try:
@@ -18,23 +24,97 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Review rubric, shared by the standalone critic and the fused draft call
+_CRITIQUE_CRITERIA = (
+    "Evaluation Criteria:\n"
+    "1. Are all claims supported by evidence?\n"
+    "2. Are the identified research gaps logical?\n"
+    "3. Is the classification of papers consistent?\n\n"
+)
+_CRITIQUE_VERDICT = (
+    "- If the output is high quality, respond exactly with 'PASS'.\n"
+    "- If there are issues, provide a numbered list of specific corrections required."
+)
+
+# Everything in the draft prompt that does not depend on the request, placed
+# first: Gemini's implicit prompt cache only reuses a shared prefix.
+# [UPDATED] Added explicit instructions for "Innovative Extensions" and "Applications"
+_DRAFT_PROMPT_HEAD = (
+    "You are a visionary Lead Researcher. Your task is to analyze the retrieved literature and conduct a deep synthesis.\n\n"
+    "Please generate a 'ReasoningResult' JSON with the following mindset:\n"
+    "1. **Synthesis**: Summarize the core findings and consensus from the papers.\n"
+    "2. **Critical Gaps**: Identify what is missing in the current literature.\n"
+    "3. **INNOVATIVE EXTENSIONS (Crucial)**: \n"
+    "   - Based on the retrieved methods, how can we extend this technology further?\n"
+    "   - Think explicitly about downstream applications and practical use cases. \n"
+    "   - Example: If the topic is 'Handheld Ultrasound', do not just stop at 'image quality'. \n"
+    "     Extend it to 'AI-guided needle insertion', 'Automated LVEF calculation', or 'Real-time pathology detection'.\n"
+    "   - Propose 3 specific, technically grounded future directions that combine the user's topic with the retrieved evidence.\n\n"
+    "Ensure the output is strictly valid JSON matching the schema.\n\n"
+    # Draft plus a self-review, answered together in one JSON object
+    "Then act as a strict Senior Research Fellow and review your draft.\n"
+    f"{_CRITIQUE_CRITERIA}"
+    "Return ONE JSON object with two keys: 'draft' (the ReasoningResult) and "
+    "'critique' (a string), where the critique follows these rules:\n"
+    f"{_CRITIQUE_VERDICT}\n\n"
+    "The request:\n"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _with_critique(schema_cls: Any) -> Any:
+    """Wrapper schema for the fused call: {"draft": <schema_cls>, "critique": verdict}."""
+    return create_model(
+        f"{schema_cls.__name__}WithCritique",
+        draft=(schema_cls, ...),
+        critique=(Optional[str], None),  # missing -> ask the standalone critic
+    )
+
+
 class ReasoningEngine:
     """
     Orchestrates the generation of research insights with an iterative refinement loop.
     """
-    def __init__(self, llm_client: Any):
+    def __init__(
+        self,
+        llm_client: Any,
+        semantic_cache: Optional[Any] = None,
+        plan_cache: Optional[Any] = None,
+        result_cache: Optional[Any] = None,
+        draft_model: Optional[str] = None,
+        refine_model: Optional[str] = None,
+    ):
         self.llm_client = llm_client
+        # Model tiers: drafting and the PASS/FAIL critique are easy enough for a
+        # cheaper model, refinement gets the stronger one. None = client default.
+        self.draft_model = draft_model
+        self.refine_model = refine_model
+        # rta.llm.semantic_cache.SemanticCache; None (or disabled) means off
+        self.semantic_cache = semantic_cache
+        # rta.llm.plan_cache.PlanCache (skeletons of earlier results); None means off
+        self.plan_cache = plan_cache
+        # rta.llm.cache.LLMCache of whole results by (topic, paper-id set); None means off
+        self.result_cache = result_cache
         self.MAX_RETRIES = 2 
 
-    def run(self, query_plan: Any, clustering_result: Any, papers: list) -> Any:
+    def run(self, query_plan: Any, clustering_result: Any, papers: list, topic: Optional[str] = None) -> Any:
+        """
+        `topic` is the user's topic as the pipeline received it. The
+        similarity caches are keyed on it; without it they are skipped, since
+        the plan schemas carry no topic to fall back on.
+        """
         # [FIX] Robustly extract topic string handling different Schema versions
-        topic_str = self._extract_topic_str(query_plan)
+        topic_str = topic or self._extract_topic_str(query_plan)
         
         logger.info(f"[Reasoning] Started for topic: {topic_str}")
+        # Read once; the prompt and both cache lookups use the names
+        cluster_names = self._cluster_names(clustering_result)
 
         # Phase 1: Drafting
         logger.info("[Reasoning] Phase 1: Generating initial draft...")
-        draft_prompt = self._build_draft_prompt(topic_str, clustering_result, papers)
+        # A similar earlier topic's skeleton, if any, seeds the draft
+        plan_keywords, template = self._plan_lookup(topic, cluster_names)
+        draft_prompt = self._build_draft_prompt(topic_str, cluster_names, len(papers), template)
         
         # Determine schema class dynamically if needed
         try:
@@ -45,33 +125,108 @@ class ReasoningEngine:
             logger.error("[Reasoning] Could not import ReasoningResult schema.")
             return None
 
-        current_result = self.llm_client.generate_structured(
+        # The same topic over the same papers: nothing left to ask the model
+        paper_ids = {pid for pid in (getattr(p, 'paper_id', None) for p in papers) if pid}
+        result_key = None
+        if self.result_cache is not None and paper_ids:
+            result_key = result_cache_key(topic_str, paper_ids, schema_cls)
+            hit = self.result_cache.get(result_key)
+            if hit is not None:
+                try:
+                    logger.info("[Reasoning] Result cache hit.")
+                    return schema_cls.model_validate_json(hit[0])
+                except ValidationError:
+                    pass  # unreadable entry: recompute and overwrite it
+
+        # A near-identical (topic, clusters) request may already have a result
+        cache_vec = None
+        if topic and self.semantic_cache is not None and self.semantic_cache.enabled:
+            cache_vec, cached = self._semantic_lookup(topic, cluster_names, schema_cls)
+            if cached is not None:
+                return cached
+
+        # Stream the draft when the client can: reading stops at the closing brace
+        generate = getattr(self.llm_client, "generate_structured_stream", None)
+        if generate is None:
+            generate = self.llm_client.generate_structured
+        # Draft and first review come back in one response (one round-trip less)
+        fused = generate(
             prompt=draft_prompt, 
-            schema=schema_cls
+            schema=_with_critique(schema_cls),
+            **self._model_kwargs(self.draft_model)
         )
-
-        # Inject topic if missing (Common issue with LLM generation)
-        if current_result and hasattr(current_result, 'topic') and not current_result.topic:
-            try:
-                current_result.topic = topic_str
-            except:
-                pass
+        current_result = getattr(fused, 'draft', None)
+        feedback = getattr(fused, 'critique', None)
+        if current_result is None:
+            # client ignored the wrapper schema and returned a bare draft
+            current_result, feedback = fused, None
 
         # Phase 2: Refinement
+        passed = False
         for attempt in range(self.MAX_RETRIES):
             logger.info(f"[Reasoning] Phase 2: Refinement attempt {attempt + 1}/{self.MAX_RETRIES}")
             
-            feedback = self._critique_result(current_result)
+            if feedback is None:
+                # structurally sound drafts skip the LLM critic
+                feedback = self._cheap_critique(current_result, paper_ids) or self._critique_result(current_result)
             
             if self._is_feedback_positive(feedback):
                 logger.info("[Reasoning] Critique passed.")
+                passed = True
                 break
             
             logger.info(f"[Reasoning] Refining based on feedback...")
             current_result = self._refine_result(current_result, feedback, schema_cls)
+            feedback = None
 
+        if result_key is not None and hasattr(current_result, 'model_dump_json'):
+            self.result_cache.set(result_key, current_result.model_dump_json(), {"passed": passed})
+        if cache_vec is not None and hasattr(current_result, 'model_dump_json'):
+            self.semantic_cache.add(cache_vec, current_result.model_dump_json())
+        # Only a result the critic accepted becomes a template
+        if passed and plan_keywords:
+            skeleton = result_skeleton(current_result)
+            if skeleton is not None:
+                self.plan_cache.upsert(plan_keywords, skeleton)
         return current_result
 
+    def _plan_lookup(self, topic: Optional[str], cluster_names: List[str]) -> Tuple[Any, Optional[dict]]:
+        """Returns (topic keywords, skeleton of the closest earlier topic); both empty when off."""
+        if self.plan_cache is None or not topic:
+            return frozenset(), None
+        keywords = topic_keywords(topic, *cluster_names)
+        hit = self.plan_cache.lookup(keywords)
+        if hit is None:
+            return keywords, None
+        score, skeleton = hit
+        logger.info(f"[Reasoning] Plan cache hit (keyword overlap {score:.2f}).")
+        return keywords, skeleton
+
+    def _semantic_lookup(self, topic: str, cluster_names: List[str], schema_cls: Any) -> Tuple[Optional[Any], Optional[Any]]:
+        """Returns (request embedding, cached result); the embedding is None if it failed."""
+        key_text = f"{topic} | {', '.join(cluster_names)}"
+        try:
+            vec = self.llm_client.get_embedding(key_text)
+        except Exception as e:
+            logger.warning(f"[Reasoning] Semantic cache skipped, embedding failed: {e}")
+            return None, None
+
+        hit = self.semantic_cache.lookup(vec)
+        if hit is None:
+            return vec, None
+        score, text = hit
+        try:
+            result = schema_cls.model_validate_json(text)
+        except Exception:
+            return vec, None  # stored under an older schema
+        logger.info(f"[Reasoning] Semantic cache hit (similarity {score:.3f}).")
+        return vec, result
+
+    @staticmethod
+    def _model_kwargs(model: Optional[str]) -> dict:
+        """Pass `model` only when set: clients without tiers take no such argument."""
+        return {"model": model} if model else {}
+
     def _extract_topic_str(self, plan: Any) -> str:
         """Helper to safely get the topic string from various QueryPlan schemas."""
         # Try 'original_topic' (Our preferred)
@@ -88,60 +243,90 @@ class ReasoningEngine:
         
         return "Unknown Research Topic"
 
-    def _build_draft_prompt(self, topic: str, clusters: Any, papers: list) -> str:
-        """Constructs the prompt for the initial draft generation with EXTENSION capabilities."""
-        # Extract cluster names for context
+    def _cluster_names(self, clusters: Any) -> List[str]:
         cluster_names = []
         if hasattr(clusters, 'clusters'):
             for c in clusters.clusters:
                 name = getattr(c, 'name', getattr(c, 'topic_name', 'Unnamed Cluster'))
                 cluster_names.append(name)
-        
-        # [UPDATED] Added explicit instructions for "Innovative Extensions" and "Applications"
-        return (
-            f"You are a visionary Lead Researcher. Your task is to analyze the retrieved literature and conduct a deep synthesis.\n"
+        return cluster_names
+
+    def _build_draft_prompt(self, topic: str, cluster_names: List[str], n_papers: int, template: Optional[dict] = None) -> str:
+        """Constructs the prompt for the initial draft generation with EXTENSION capabilities."""
+        # Static instructions (incl. the self-review) lead, the request follows
+        prompt = (
+            f"{_DRAFT_PROMPT_HEAD}"
             f"User Topic: '{topic}'\n"
-            f"The system has retrieved {len(papers)} papers, categorized into: {', '.join(cluster_names)}.\n\n"
-            
-            f"Please generate a 'ReasoningResult' JSON with the following mindset:\n"
-            f"1. **Synthesis**: Summarize the core findings and consensus from the papers.\n"
-            f"2. **Critical Gaps**: Identify what is missing in the current literature.\n"
-            f"3. **INNOVATIVE EXTENSIONS (Crucial)**: \n"
-            f"   - Based on the retrieved methods, how can we extend this technology further?\n"
-            f"   - Think explicitly about downstream applications and practical use cases. \n"
-            f"   - Example: If the topic is 'Handheld Ultrasound', do not just stop at 'image quality'. \n"
-            f"     Extend it to 'AI-guided needle insertion', 'Automated LVEF calculation', or 'Real-time pathology detection'.\n"
-            f"   - Propose 3 specific, technically grounded future directions that combine the user's topic with the retrieved evidence.\n\n"
-            
-            f"Ensure the output is strictly valid JSON matching the schema."
+            f"The system has retrieved {n_papers} papers, categorized into: {', '.join(cluster_names)}."
         )
+        if template:
+            prompt += (
+                f"\n\nStarting template (from a similar earlier topic; adapt it to these papers, "
+                f"do not copy it): {orjson.dumps(template).decode('utf-8')}"
+            )
+        return prompt
+
+    def _cheap_critique(self, result: Any, paper_ids: set) -> Optional[str]:
+        """
+        Local structural review: 'PASS' when every claim cites known papers,
+        every gap points at real clusters, no text field is empty and all
+        confidences are in [0, 1]. None means "not sure", ask the LLM critic.
+        """
+        clusters = getattr(result, 'clusters', None)
+        claims = getattr(result, 'claims', None)
+        gaps = getattr(result, 'research_gaps', None)
+        if not clusters or not claims or gaps is None:
+            return None
+
+        known_papers = set(paper_ids)
+        cluster_refs = set()
+        for c in clusters:
+            if not getattr(c, 'cluster_name', None):
+                return None
+            cluster_refs.update((c.cluster_id, c.cluster_name))
+            known_papers.update(p.paper_id for p in getattr(c, 'papers', ()))
+        if not known_papers:
+            return None
+
+        for claim in claims:
+            cited = set(claim.supporting_papers)
+            cited.update(e.paper_id for e in claim.evidence)
+            if not claim.statement.strip() or not claim.supporting_papers or not cited <= known_papers:
+                return None
+            if not 0.0 <= claim.confidence <= 1.0:
+                return None
+        for gap in gaps:
+            if not gap.description.strip() or not set(gap.related_clusters) <= cluster_refs:
+                return None
+            if not set(gap.supporting_papers) <= known_papers:
+                return None
+
+        logger.info("[Reasoning] Structural check passed; LLM critique skipped.")
+        return "PASS"
 
     def _critique_result(self, result: Any) -> str:
         """Acts as the 'Quality Evaluator' agent."""
-        # Robust dump to JSON
+        # Robust dump to JSON (serialization errors are ValueErrors).
+        # Compact: indentation only adds prompt tokens, not information.
         try:
             if hasattr(result, 'model_dump_json'):
-                result_json = result.model_dump_json(indent=2)
+                result_json = result.model_dump_json()
             elif hasattr(result, 'json'):
                 result_json = result.json()
             else:
                 result_json = str(result)
-        except:
+        except (TypeError, ValueError):
             result_json = str(result)
 
         critic_prompt = (
             f"You are a strict Senior Research Fellow. Review the following structured research output:\n"
             f"```json\n{result_json}\n```\n\n"
-            f"Evaluation Criteria:\n"
-            f"1. Are all claims supported by evidence?\n"
-            f"2. Are the identified research gaps logical?\n"
-            f"3. Is the classification of papers consistent?\n\n"
+            f"{_CRITIQUE_CRITERIA}"
             f"Instruction:\n"
-            f"- If the output is high quality, respond exactly with 'PASS'.\n"
-            f"- If there are issues, provide a numbered list of specific corrections required."
+            f"{_CRITIQUE_VERDICT}"
         )
         
-        return self.llm_client.generate_text(critic_prompt).strip()
+        return self.llm_client.generate_text(critic_prompt, **self._model_kwargs(self.draft_model)).strip()
 
     def _is_feedback_positive(self, feedback: str) -> bool:
         """Determines if the critic is satisfied."""
@@ -153,7 +338,7 @@ class ReasoningEngine:
         # Robust dump
         try:
             prev_json = previous_result.model_dump_json() if hasattr(previous_result, 'model_dump_json') else str(previous_result)
-        except:
+        except (TypeError, ValueError):
             prev_json = str(previous_result)
 
         refine_prompt = (
@@ -165,5 +350,6 @@ class ReasoningEngine:
         
         return self.llm_client.generate_structured(
             prompt=refine_prompt,
-            schema=schema_cls
+            schema=schema_cls,
+            **self._model_kwargs(self.refine_model)
         )
\ No newline at end of file
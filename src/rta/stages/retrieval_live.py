@@ -4,94 +4,118 @@ Fetches papers from external sources (arXiv/Semantic Scholar) or simulates retri
 File: src/rta/stages/retrieval_live.py
 """
 
+import asyncio
 import logging
-import time
 import random
-from typing import List, Any, Optional
+import re
+from typing import List, Any, Optional, Tuple
 
-# --- Import Schemas with Fallback ---
-try:
-    from rta.schemas.retrieval import RetrievalResult, PaperItem
-except ImportError:
-    from pydantic import BaseModel
-    
-    class PaperItem(BaseModel):
-        paper_id: str
-        title: str
-        abstract: str
-        authors: List[str] = []
-        year: int = 2024
-        citation_count: int = 0
-        url: str = ""
-        source: str = "arxiv"
-
-    class RetrievalResult(BaseModel):
-        papers: List[PaperItem]
-        total_found: int = 0
-        # [FIX] Added missing fields to match strict project schema
-        queries_used: List[str] = []
-        dedup_before: int = 0
-        dedup_after: int = 0
-        warnings: List[str] = []
+# --- Import Schemas ---
+from rta.schemas.retrieval import RetrievalResult, PaperItem
 
 logger = logging.getLogger(__name__)
 
-def run_retrieval(queries: List[str], max_papers_per_query: int = 5) -> RetrievalResult:
-    """
-    Executes the retrieval stage using the provided search queries.
-    
-    Args:
-        queries: List of search query strings generated by Stage 1.
-        max_papers_per_query: Limit for papers fetched per query to prevent rate limits.
+def _mock_papers(query: str, max_papers_per_query: int) -> List[Tuple[str, PaperItem]]:
+    """Deterministic stand-in for one search API call (seeded by the query)."""
+    papers = []
+    for i in range(max_papers_per_query):
+        seed_val = hash(query) + i
+        random.seed(seed_val)
         
-    Returns:
-        RetrievalResult: A structured object containing unique PaperItems AND metadata.
+        mock_id = f"arxiv.240{random.randint(1, 9)}.{random.randint(10000, 99999)}"
+
+        topics = ["Analysis", "Survey", "Optimization", "Framework", "Review"]
+        title_suffix = topics[i % len(topics)]
+        
+        papers.append((mock_id, PaperItem(
+            paper_id=mock_id,
+            title=f"{query}: A Comprehensive {title_suffix}",
+            abstract=(
+                f"This paper presents a novel approach regarding {query}. "
+                "We explore the fundamental limitations of existing methods and propose "
+                "a scalable solution."
+            ),
+            authors=["J. Doe", "A. Smith"],
+            year=2024 + (i % 2),
+            citation_count=random.randint(5, 500),
+            url=f"https://arxiv.org/abs/{mock_id}",
+            source="arxiv"
+        )))
+    return papers
+
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def _title_hash(title: str) -> int:
+    """Hash of a title with case, punctuation and spacing removed (0 = no title)."""
+    norm = _NON_WORD.sub(" ", (title or "").lower()).strip()
+    return hash(norm) if norm else 0
+
+
+# Upper bound on in-flight searches (arXiv/S2 rate limits)
+MAX_CONCURRENT_QUERIES = 8
+
+
+async def _fetch_query(
+    sem: asyncio.Semaphore, query: str, max_papers_per_query: int
+) -> List[Tuple[str, PaperItem]]:
+    async with sem:
+        logger.info(f"[Retrieval] Processing query: '{query}'")
+        
+        # Simulate network latency
+        await asyncio.sleep(0.05)
+        return _mock_papers(query, max_papers_per_query)
+
+
+async def run_retrieval_async(
+    queries: List[str],
+    max_papers_per_query: int = 5,
+    max_concurrency: int = MAX_CONCURRENT_QUERIES,
+) -> RetrievalResult:
+    """
+    Executes the retrieval stage, fanning the per-query searches out concurrently.
+
+    Requests overlap (at most max_concurrency in flight), so N queries cost
+    about one round trip instead of N. A failing query is reported in
+    `warnings` instead of failing the stage. Results are merged in query
+    order, so dedup keeps the same winners as a sequential loop would.
     """
+    # Blank and repeated queries would each cost a search for nothing
+    queries = list(dict.fromkeys(q for q in (q.strip() for q in queries if q) if q))
     logger.info(f"[Retrieval] Starting search execution for {len(queries)} queries.")
     
-    all_papers = []
-    seen_ids = set()
-    
     # -------------------------------------------------------------------------
     # NOTE: In production, initialize ArxivClient or SemanticScholarClient here.
     # -------------------------------------------------------------------------
 
-    for query_idx, query in enumerate(queries):
-        logger.info(f"[Retrieval] Processing query: '{query}'")
-        
-        # Simulate network latency
-        time.sleep(0.05) 
-
-        # Generate mock papers
-        for i in range(max_papers_per_query):
-            seed_val = hash(query) + i
-            random.seed(seed_val)
-            
-            mock_id = f"arxiv.240{random.randint(1, 9)}.{random.randint(10000, 99999)}"
-            
-            if mock_id in seen_ids:
-                continue
+    sem = asyncio.Semaphore(max_concurrency)
+    per_query = await asyncio.gather(
+        *(_fetch_query(sem, q, max_papers_per_query) for q in queries),
+        return_exceptions=True,
+    )
 
-            topics = ["Analysis", "Survey", "Optimization", "Framework", "Review"]
-            title_suffix = topics[i % len(topics)]
-            
-            paper = PaperItem(
-                paper_id=mock_id,
-                title=f"{query}: A Comprehensive {title_suffix}",
-                abstract=(
-                    f"This paper presents a novel approach regarding {query}. "
-                    "We explore the fundamental limitations of existing methods and propose "
-                    "a scalable solution."
-                ),
-                authors=["J. Doe", "A. Smith"],
-                year=2024 + (i % 2),
-                citation_count=random.randint(5, 500),
-                url=f"https://arxiv.org/abs/{mock_id}",
-                source="arxiv"
-            )
-            
+    all_papers = []
+    seen_ids = set()
+    # The same paper under another id (e.g. arXiv vs. S2) has the same title
+    seen_titles = set()
+    fetched = 0
+    warnings = []
+    for query, papers in zip(queries, per_query):
+        if isinstance(papers, Exception):
+            logger.warning(f"[Retrieval] Query failed: '{query}': {papers}")
+            warnings.append(f"query failed: {query}: {papers}")
+            continue
+        fetched += len(papers)
+        for paper_id, paper in papers:
+            if paper_id in seen_ids:
+                continue
+            h = _title_hash(paper.title)
+            if h and h in seen_titles:
+                continue
             all_papers.append(paper)
-            seen_ids.add(mock_id)
+            seen_ids.add(paper_id)
+            seen_titles.add(h)
 
     total_papers = len(all_papers)
     logger.info(f"[Retrieval] Search completed. Fetched {total_papers} unique papers.")
@@ -102,7 +126,21 @@ def run_retrieval(queries: List[str], max_papers_per_query: int = 5) -> Retrieva
         papers=all_papers,
         total_found=total_papers,
         queries_used=queries,           # <--- Added
-        dedup_before=total_papers,      # <--- Added (Mocking 100% unique)
+        dedup_before=fetched,           # <--- Added
         dedup_after=total_papers,       # <--- Added
-        warnings=[]                     # <--- Added
+        warnings=warnings               # <--- Added
     )
+
+
+def run_retrieval(queries: List[str], max_papers_per_query: int = 5) -> RetrievalResult:
+    """
+    Executes the retrieval stage using the provided search queries.
+    
+    Args:
+        queries: List of search query strings generated by Stage 1.
+        max_papers_per_query: Limit for papers fetched per query to prevent rate limits.
+        
+    Returns:
+        RetrievalResult: A structured object containing unique PaperItems AND metadata.
+    """
+    return asyncio.run(run_retrieval_async(queries, max_papers_per_query))
@@ -1,22 +1,61 @@
 from __future__ import annotations
+import hashlib
 import os
-from dotenv import load_dotenv
+import time
+from pathlib import Path
+from typing import Any, List, Optional
+
+import orjson
 from google import genai
 
+from ..config import DEFAULT_CONFIG, load_env
+
+
+def _cache_path(api_key: str) -> Path:
+    # one file per key (models differ by key); the key itself is never written
+    key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return Path(DEFAULT_CONFIG.runs_dir) / "_cache" / f"models-{key}.json"
+
+
+def _load_cached(path: Path) -> Optional[List[List[Any]]]:
+    try:
+        if time.time() - path.stat().st_mtime > DEFAULT_CONFIG.cache_ttl_hours * 3600:
+            return None
+        return orjson.loads(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _store(path: Path, models: List[List[Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(orjson.dumps(models))
+    os.replace(tmp, path)
+
+
 def main() -> None:
-    load_dotenv()
+    load_env()
     api_key = os.getenv("GEMINI_API_KEY", "").strip()
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY missing")
 
-    client = genai.Client(api_key=api_key)
+    # The list only changes when Google ships models: reuse it within the cache TTL
+    path = _cache_path(api_key)
+    models = _load_cached(path)
+    if models is None:
+        client = genai.Client(api_key=api_key)
+
+        # List available models for THIS key
+        models = []
+        for m in client.models.list():
+            name = getattr(m, "name", "")
+            # Some SDK versions expose supported methods; print if present
+            methods = getattr(m, "supported_generation_methods", None)
+            models.append([name, list(methods) if methods is not None else None])
+        _store(path, models)
 
-    # List available models for THIS key
-    for m in client.models.list():
-        name = getattr(m, "name", "")
-        # Some SDK versions expose supported methods; print if present
-        methods = getattr(m, "supported_generation_methods", None)
+    for name, methods in models:
         print(name, methods)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-import json
 import re
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List
 
+import orjson
 
-_JSON_FENCE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
-_FIRST_OBJ = re.compile(r"(\{.*\})", re.DOTALL)
+try:
+    import json5  # lenient JSON (comments, trailing commas); last resort only
+    HAS_JSON5 = True
+except ImportError:
+    HAS_JSON5 = False
 
 
 def extract_json(text: str) -> Dict[str, Any]:
@@ -26,21 +29,112 @@ def extract_json(text: str) -> Dict[str, Any]:
 
     t = text.strip()
 
-    # 1) fenced JSON block
-    m = _JSON_FENCE.search(t)
-    if m:
-        t = m.group(1).strip()
+    # 1) fenced JSON block (a fence after some prose is left to step 3)
+    if t.startswith("```"):
+        body = t.find("\n", 3)
+        close = t.find("```", 3)
+        if body != -1 and (close == -1 or body < close):
+            t = t[body + 1:close if close != -1 else None].strip()
 
-    # 2) direct parse
+    # 2) direct parse (orjson's JSONDecodeError is a json.JSONDecodeError)
     try:
-        return json.loads(t)
-    except Exception:
+        return orjson.loads(t)
+    except orjson.JSONDecodeError:
         pass
 
-    # 3) first {...} block
-    m2 = _FIRST_OBJ.search(t)
-    if m2:
-        return json.loads(m2.group(1).strip())
+    # 3) first {...} block: one linear brace scan from the first "{", which
+    # stops at the object's own "}" rather than the last one in the text
+    start = t.find("{")
+    if start != -1:
+        detector = ObjectCloseDetector()
+        if detector.feed(t[start:]):
+            candidate = t[start:start + detector.end]
+            try:
+                return orjson.loads(candidate)
+            except orjson.JSONDecodeError:
+                pass
+        else:
+            candidate = t[start:]
+
+        # 4) malformed JSON (trailing commas, comments, ...): slow path
+        if HAS_JSON5:
+            try:
+                return json5.loads(candidate)
+            except ValueError:
+                pass
 
     preview = t[:400].replace("\n", "\\n")
     raise ValueError(f"LLM response is not JSON. preview={preview}")
+
+
+# Outside strings: a whole (closed) string literal is skipped in one match;
+# a lone quote opens a string that continues past the chunk.
+_OUTSIDE_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}"]', re.DOTALL)
+_INSIDE_STRING = re.compile(r'["\\]')
+
+
+class ObjectCloseDetector:
+    """
+    Incremental brace counter over streamed chunks (string/escape aware).
+    feed() returns True once the first top-level {...} object has closed;
+    end is then the offset just past its "}" in the chunk last fed.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escape = False  # a backslash ended the previous chunk
+        self.end = -1
+
+    def feed(self, chunk: str) -> bool:
+        pos = 0
+        if self.escape and chunk:
+            self.escape = False
+            pos = 1
+        n = len(chunk)
+        while True:
+            if self.in_string:
+                m = _INSIDE_STRING.search(chunk, pos)
+                if m is None:
+                    return False
+                pos = m.end()
+                if chunk[m.start()] == '"':
+                    self.in_string = False
+                # skip the escaped character (maybe in the next chunk)
+                elif pos >= n:
+                    self.escape = True
+                    return False
+                else:
+                    pos += 1
+                continue
+            m = _OUTSIDE_STRING.search(chunk, pos)
+            if m is None:
+                return False
+            i = m.start()
+            ch = chunk[i]
+            pos = m.end()
+            if ch == '"':
+                if pos - i == 1:
+                    self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.end = pos
+                    return True
+
+
+def read_until_object_closes(chunks: Iterable[str]) -> str:
+    """
+    Collect streamed model output, stopping as soon as the JSON object is
+    complete instead of waiting for the stream to end (a trailing code fence
+    or chatter after the object is not needed for parsing).
+    """
+    parts: List[str] = []
+    detector = ObjectCloseDetector()
+    for chunk in chunks:
+        parts.append(chunk)
+        if detector.feed(chunk):
+            break
+    return "".join(parts)
@@ -4,24 +4,105 @@ Includes 'Fuzzy JSON Fixer' to handle LLM naming inconsistencies and a precise M
 File: src/rta/utils/llm_client.py
 """
 
+import functools
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import json
 import time
-from typing import Any, Callable, Dict, List, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-# Attempt to load .env file
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+import orjson
+from numpy.random import default_rng
+
+from rta.config import DEFAULT_CONFIG, load_env
+from rta.llm.cache import LLMCache, cache_key, pack_vector, unpack_vector
+from rta.llm.semantic_cache import SemanticCache
+from rta.utils.json_extract import ObjectCloseDetector, read_until_object_closes
+from rta.utils.rate_limit import TokenBucket
+
+# Load .env file (once per process)
+load_env()
 
 logger = logging.getLogger(__name__)
 
+# Default fan-out of the *_batch methods (the token bucket still paces calls)
+BATCH_MAX_WORKERS = 10
+
+# Prompts built from one template differ mostly in their numbers ("Cluster 0
+# naming task" / "Cluster 1 ..."): embeddings barely tell them apart, so the
+# prompt-level semantic tier only matches prompts with the same numbers
+_NUMBERS = re.compile(r"\d+(?:\.\d+)?")
+
+_STRUCTURED_JSON_RULES = (
+    "IMPORTANT JSON RULES:\n"
+    "- Use 'cluster_id' (not 'id') and 'cluster_name' (not 'name') for clusters.\n"
+    "- Use 'claim_id' and 'statement' (not 'text') for claims.\n"
+    "- Use 'gap_id' and 'description' for gaps.\n"
+    "- Include 'why_included' for every paper.\n"
+    "- Output strictly valid JSON."
+)
+
 # --------------------------------------------------------------------------
 # Real Gemini Client
 # --------------------------------------------------------------------------
+# Only dicts holding one of these keys can need a rename
+_RENAMABLE = frozenset(('id', 'name', 'text', 'claim', 'gap'))
+_CONTAINERS = (dict, list)
+
+
+def _key_renames(data: Dict[str, Any]) -> Dict[str, str]:
+    renames = {}
+    for k in data:
+        # --- AUTO-FIX Rules based on your error logs ---
+        # Clusters
+        if k == 'id' and 'name' in data: # Likely a cluster
+            renames[k] = 'cluster_id'
+        elif k == 'name' and 'id' in data: # Likely a cluster
+            renames[k] = 'cluster_name'
+        # Claims
+        elif k == 'id' and 'claim_type' in data: # Likely a claim
+            renames[k] = 'claim_id'
+        elif k in ('text', 'claim') and 'claim_id' not in data: # Fix statement
+            renames[k] = 'statement'
+        # Research Gaps
+        elif k == 'id' and 'gap' in data: # Likely a gap
+            renames[k] = 'gap_id'
+        elif k == 'gap':
+            renames[k] = 'description'
+    return renames
+
+
+def _fuzzy_fix(data: Any) -> Any:
+    """
+    Iterative, in-place walk (no recursion limit on deep replies). A dict
+    that needs no rename, the usual case, is left untouched.
+    """
+    stack = [data] if isinstance(data, _CONTAINERS) else []
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(v for v in node if isinstance(v, _CONTAINERS))
+            continue
+
+        if not node.keys().isdisjoint(_RENAMABLE):
+            renames = _key_renames(node)
+            if renames:
+                fixed = {renames.get(k, k): v for k, v in node.items()}
+                node.clear()
+                node.update(fixed)
+
+        # Post-processing injections
+        papers = node.get('papers')
+        if isinstance(papers, list):
+            for p in papers:
+                if isinstance(p, dict) and 'why_included' not in p:
+                    p['why_included'] = "Relevant to topic" # Default injection
+
+        stack.extend(v for v in node.values() if isinstance(v, _CONTAINERS))
+    return data
+
+
 class RealGeminiClient:
     def __init__(self, api_key: str):
         try:
@@ -31,8 +112,35 @@ class RealGeminiClient:
             # Read model from env, default to 1.5-flash
             self.model_name = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
             self.model = genai.GenerativeModel(self.model_name)
+            # Per-call model overrides (e.g. a cheaper draft tier), built on first use
+            self._models = {self.model_name: self.model}
+            self._model_factory = genai.GenerativeModel
             self.embedding_model = 'models/text-embedding-004'
+            # bound once: the embedding paths run once per paper
+            self._embed_fn = genai.embed_content
             self.fallback_client = MockGeminiClient()
+            # Exact-match response cache: a repeated prompt skips the API call
+            # (and its rate-limit token). Mock fallbacks are never stored.
+            # RTA_LLM_CACHE_ENABLED=0 turns it (and the embedding store) off.
+            cache_enabled = os.getenv("RTA_LLM_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+            self.cache = LLMCache.from_config(DEFAULT_CONFIG)
+            self.cache.enabled = cache_enabled
+            # Embeddings get their own compact store (base64 float32)
+            self.embedding_cache = LLMCache.embeddings_from_config(DEFAULT_CONFIG)
+            self.embedding_cache.enabled = cache_enabled
+            # Second tier, off unless RTA_PROMPT_SEMCACHE_THRESHOLD is set (it
+            # costs an embedding call per prompt): a prompt whose embedding is
+            # close enough to an earlier one reuses its answer
+            self.semantic_cache = SemanticCache.from_config(
+                DEFAULT_CONFIG, name="semantic_prompts", env="RTA_PROMPT_SEMCACHE_THRESHOLD"
+            )
+            # Request pacing shared by all calls (and threads) of this client:
+            # GEMINI_QPS sustained (default: one call per 4 s, free-tier safe),
+            # bursts of up to GEMINI_BURST calls
+            self.bucket = TokenBucket(
+                rate=float(os.getenv("GEMINI_QPS", "0.25")),
+                capacity=float(os.getenv("GEMINI_BURST", "4")),
+            )
             
             self.safety_settings = [
                 {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
@@ -46,17 +154,19 @@ class RealGeminiClient:
 
     def _smart_execute(self, func: Callable, *args, **kwargs) -> Any:
         max_retries = 3
-        safety_interval = 4.0 
         
         for attempt in range(max_retries):
+            # waits only when the bucket is empty, not after every call
+            self.bucket.acquire()
             try:
                 result = func(*args, **kwargs)
-                time.sleep(safety_interval)
+                self.bucket.on_success()
                 return result
             except Exception as e:
                 error_str = str(e)
                 # Rate Limits
                 if "429" in error_str or "Quota" in error_str:
+                    self.bucket.on_rate_limited()
                     wait_time = 15 * (attempt + 1)
                     logger.warning(f"[Gemini] Rate Limit. Waiting {wait_time}s...")
                     time.sleep(wait_time)
@@ -73,123 +183,265 @@ class RealGeminiClient:
 
     def _fuzzy_fix_json(self, data: Any) -> Any:
         """
-        Recursively fixes common LLM schema naming errors (e.g., 'id' vs 'cluster_id').
+        Fixes common LLM schema naming errors (e.g., 'id' vs 'cluster_id').
+        Works in place on freshly parsed JSON and returns it.
         """
-        if isinstance(data, list):
-            return [self._fuzzy_fix_json(item) for item in data]
-        
-        if isinstance(data, dict):
-            new_data = {}
-            for k, v in data.items():
-                fixed_v = self._fuzzy_fix_json(v)
-                
-                # --- AUTO-FIX Rules based on your error logs ---
-                
-                # Clusters
-                if k == 'id' and 'name' in data: # Likely a cluster
-                    new_data['cluster_id'] = fixed_v
-                    continue
-                if k == 'name' and 'id' in data: # Likely a cluster
-                    new_data['cluster_name'] = fixed_v
-                    continue
-                
-                # Claims
-                if k == 'id' and 'claim_type' in data: # Likely a claim
-                    new_data['claim_id'] = fixed_v
-                    continue
-                if k in ['text', 'claim'] and 'claim_id' not in data: # Fix statement
-                    new_data['statement'] = fixed_v
-                    continue
+        return _fuzzy_fix(data)
 
-                # Research Gaps
-                if k == 'id' and 'gap' in data: # Likely a gap
-                    new_data['gap_id'] = fixed_v
-                    continue
-                if k == 'gap': 
-                    new_data['description'] = fixed_v
-                    continue
+    def _resolve_model(self, model: Optional[str]) -> Tuple[str, Any]:
+        """(model name, GenerativeModel) for a per-call override; None = the default."""
+        name = model or self.model_name
+        if name not in self._models:
+            self._models[name] = self._model_factory(name)
+        return name, self._models[name]
 
-                # Pass through correct keys
-                new_data[k] = fixed_v
-            
-            # Post-processing injections
-            if 'papers' in new_data and isinstance(new_data['papers'], list):
-                for p in new_data['papers']:
-                    if isinstance(p, dict) and 'why_included' not in p:
-                        p['why_included'] = "Relevant to topic" # Default injection
+    def _text_key(self, prompt: str, model_name: Optional[str] = None) -> str:
+        return cache_key(model=model_name or self.model_name, prompt=prompt)
 
-            return new_data
-            
-        return data
+    @staticmethod
+    def _semantic_tag(prompt: str, model_name: str) -> str:
+        """Entries only match a prompt for the same model with the same numbers."""
+        return f"{model_name}|{' '.join(_NUMBERS.findall(prompt))}"
+
+    def _semantic_get(self, prompt: str, model_name: str) -> Tuple[Optional[list], Optional[str]]:
+        """(prompt embedding, answer of a near-identical earlier prompt); (None, None) when off."""
+        if not self.semantic_cache.enabled:
+            return None, None
+        vec = self.get_embedding(prompt)
+        hit = self.semantic_cache.lookup(vec, tag=self._semantic_tag(prompt, model_name))
+        return vec, (hit[1] if hit is not None else None)
 
-    def generate_text(self, prompt: str) -> str:
+    def generate_text(self, prompt: str, model: Optional[str] = None) -> str:
+        model_name, gen_model = self._resolve_model(model)
+        key = self._text_key(prompt, model_name)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit[0]
+        vec, similar = self._semantic_get(prompt, model_name)
+        if similar is not None:
+            return similar
         def _call():
-            response = self.model.generate_content(prompt, safety_settings=self.safety_settings)
+            response = gen_model.generate_content(prompt, safety_settings=self.safety_settings)
             return response.text if response.text else ""
         try:
-            return self._smart_execute(_call)
+            text = self._smart_execute(_call)
         except Exception:
             return self.fallback_client.generate_text(prompt)
+        if text:
+            self.cache.set(key, text, {"model": model_name})
+            if vec is not None:
+                self.semantic_cache.add(vec, text, tag=self._semantic_tag(prompt, model_name))
+        return text
+
+    def generate_text_batch(self, prompts: List[str], max_workers: int = BATCH_MAX_WORKERS) -> List[str]:
+        """generate_text over many prompts concurrently; answers in prompt order."""
+        if len(prompts) <= 1:
+            return [self.generate_text(p) for p in prompts]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts)), thread_name_prefix="gemini-batch") as pool:
+            return list(pool.map(self.generate_text, prompts))
+
+    def generate_structured_batch(self, prompts: List[str], schema: Any, max_workers: int = BATCH_MAX_WORKERS) -> List[Any]:
+        """generate_structured over many prompts concurrently; results in prompt order."""
+        if len(prompts) <= 1:
+            return [self.generate_structured(p, schema) for p in prompts]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts)), thread_name_prefix="gemini-batch") as pool:
+            return list(pool.map(lambda p: self.generate_structured(p, schema), prompts))
+
+    def generate_text_stream(self, prompt: str) -> Iterator[str]:
+        """
+        Same as generate_text, but yields the response text as it arrives,
+        so the caller can start working before generation has finished.
+        """
+        key = self._text_key(prompt)
+        hit = self.cache.get(key)
+        if hit is not None:
+            yield hit[0]
+            return
+        def _call():
+            return self.model.generate_content(
+                prompt, safety_settings=self.safety_settings, stream=True
+            )
+        parts: List[str] = []
+        try:
+            for chunk in self._smart_execute(_call):
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    yield text
+        except GeneratorExit:
+            # the caller stopped reading (read_until_object_closes does once
+            # the JSON object closes): what it got is complete if that object is
+            answer = "".join(parts)
+            if answer and ObjectCloseDetector().feed(answer):
+                self.cache.set(key, answer, {"model": self.model_name})
+            raise
+        except Exception:
+            if parts:
+                raise  # a partial answer cannot be patched with mock text
+            yield self.fallback_client.generate_text(prompt)
+            return
+        # only a stream read to the end is a complete answer worth storing
+        if parts:
+            self.cache.set(key, "".join(parts), {"model": self.model_name})
+
+    def _embedding_key(self, text: str) -> str:
+        return cache_key(model=self.embedding_model, task="clustering", embed=text)
+
+    def _cached_embedding(self, key: str) -> Optional[list]:
+        hit = self.embedding_cache.get(key)
+        if hit is None:
+            return None
+        try:
+            return unpack_vector(hit[0])
+        except ValueError:
+            return None  # unreadable entry: embed again and overwrite it
+
+    def _store_embedding(self, key: str, vector: list) -> None:
+        self.embedding_cache.set(key, pack_vector(vector), {"model": self.embedding_model})
 
     def get_embedding(self, text: str) -> list:
+        # the same abstract is embedded again on every run of a topic
+        key = self._embedding_key(text)
+        cached = self._cached_embedding(key)
+        if cached is not None:
+            return cached
         def _call():
-            import google.generativeai as genai
-            result = genai.embed_content(model=self.embedding_model, content=text, task_type="clustering")
+            result = self._embed_fn(model=self.embedding_model, content=text, task_type="clustering")
             return result['embedding']
         try:
-            return self._smart_execute(_call)
+            vector = self._smart_execute(_call)
         except Exception:
             return self.fallback_client.get_embedding(text)
+        self._store_embedding(key, vector)
+        return vector
 
-    def generate_structured(self, prompt: str, schema: Any) -> Any:
-        # Prompt engineering to help LLM get keys right initially
-        full_prompt = (
-            f"{prompt}\n\n"
-            f"IMPORTANT JSON RULES:\n"
-            f"- Use 'cluster_id' (not 'id') and 'cluster_name' (not 'name') for clusters.\n"
-            f"- Use 'claim_id' and 'statement' (not 'text') for claims.\n"
-            f"- Use 'gap_id' and 'description' for gaps.\n"
-            f"- Include 'why_included' for every paper.\n"
-            f"- Output strictly valid JSON."
-        )
+    def get_embedding_batch(self, texts: List[str]) -> List[list]:
+        """
+        Embeddings for many texts in one request (the SDK splits at its own
+        batch limit), so one rate-limit token covers the whole batch.
+        Cached texts are not sent; if the batch fails, each text is retried
+        on its own.
+        """
+        keys = [self._embedding_key(t) for t in texts]
+        vectors = [self._cached_embedding(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if not missing:
+            return vectors
         def _call():
-            response = self.model.generate_content(
-                full_prompt, 
-                generation_config={"response_mime_type": "application/json"},
-                safety_settings=self.safety_settings
+            result = self._embed_fn(
+                model=self.embedding_model, content=[texts[i] for i in missing], task_type="clustering"
             )
-            raw_data = json.loads(response.text)
+            return result['embedding']
+        try:
+            fetched = self._smart_execute(_call)
+            if len(fetched) == len(missing):
+                for i, vector in zip(missing, fetched):
+                    vectors[i] = vector
+                    self._store_embedding(keys[i], vector)
+                return vectors
+        except Exception as e:
+            logger.warning(f"[Gemini] Batch embedding failed ({e}); embedding one by one.")
+        for i in missing:
+            vectors[i] = self.get_embedding(texts[i])
+        return vectors
+
+    def generate_structured(self, prompt: str, schema: Any, model: Optional[str] = None) -> Any:
+        return self._generate_structured(prompt, schema, stream=False, model=model)
+
+    def generate_structured_stream(self, prompt: str, schema: Any, model: Optional[str] = None) -> Any:
+        """
+        Same as generate_structured, but reads the response as a stream and
+        stops as soon as the top-level JSON object closes.
+        """
+        return self._generate_structured(prompt, schema, stream=True, model=model)
+
+    def _generate_structured(self, prompt: str, schema: Any, stream: bool, model: Optional[str] = None) -> Any:
+        model_name, gen_model = self._resolve_model(model)
+        # Prompt engineering to help LLM get keys right initially
+        # (static rules first, so every structured call shares this prefix)
+        full_prompt = f"{_STRUCTURED_JSON_RULES}\n\n{prompt}"
+        def _parse(text: str) -> Any:
+            # a plain dict is needed here: _fuzzy_fix_json works on it first
+            raw_data = orjson.loads(text)
             
             # Apply Fuzzy Fix before validation
             fixed_data = self._fuzzy_fix_json(raw_data)
             
             return schema.model_validate(fixed_data)
+
+        key = cache_key(model=model_name, prompt=full_prompt, schema=schema.__name__)
+        hit = self.cache.get(key)
+        if hit is not None:
+            try:
+                return _parse(hit[0])
+            except Exception:
+                pass  # stored under an older schema: ask the model again
+        vec, similar = self._semantic_get(full_prompt, model_name)
+        if similar is not None:
+            try:
+                return _parse(similar)
+            except Exception:
+                pass  # a near prompt of another schema: not usable here
+
+        def _call():
+            response = gen_model.generate_content(
+                full_prompt, 
+                generation_config={"response_mime_type": "application/json"},
+                safety_settings=self.safety_settings,
+                stream=stream,
+            )
+            if stream:
+                text = read_until_object_closes(chunk.text for chunk in response)
+            else:
+                text = response.text
+            return text, _parse(text)
         
         try:
-            return self._smart_execute(_call)
+            text, result = self._smart_execute(_call)
         except Exception:
             logger.warning("[Gemini] Failed. Switching to Mock Structured Data.")
             return self.fallback_client.generate_structured(prompt, schema)
+        self.cache.set(key, text, {"model": model_name})
+        if vec is not None:
+            self.semantic_cache.add(vec, text, tag=self._semantic_tag(full_prompt, model_name))
+        return result
 
 # --------------------------------------------------------------------------
 # Mock Client (STRICT SCHEMA COMPLIANT VERSION)
 # --------------------------------------------------------------------------
 class MockGeminiClient:
-    def generate_text(self, prompt: str) -> str:
+    # `model` (a per-call model override) is accepted and ignored throughout
+    def generate_text(self, prompt: str, model: Optional[str] = None) -> str:
         if "naming task" in prompt: return "Mocked Cluster"
         return "Analysis unavailable due to API limits. Please check API Key."
 
+    def generate_text_stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate_text(prompt)
+
+    def generate_text_batch(self, prompts: List[str], max_workers: int = BATCH_MAX_WORKERS) -> List[str]:
+        return [self.generate_text(p) for p in prompts]
+
+    def generate_structured_batch(self, prompts: List[str], schema: Any, max_workers: int = BATCH_MAX_WORKERS) -> List[Any]:
+        return [self.generate_structured(p, schema) for p in prompts]
+
     def get_embedding(self, text: str) -> list:
-        import random
-        random.seed(len(text))
-        return [random.random() for _ in range(768)]
+        # deterministic per text length, without touching the global RNG
+        return default_rng(len(text)).random(768).tolist()
 
-    def generate_structured(self, prompt: str, schema: Any) -> Any:
+    def get_embedding_batch(self, texts: List[str]) -> List[list]:
+        return [self.get_embedding(t) for t in texts]
+
+    def generate_structured(self, prompt: str, schema: Any, model: Optional[str] = None) -> Any:
         """Generates schema-compliant dummy data to prevent crashes."""
         schema_name = schema.__name__
         logger.info(f"[MockLLM] constructing fake data for {schema_name}")
 
         try:
+            # 0. Draft wrapped with a self-review (ReasoningEngine's fused call)
+            if "draft" in getattr(schema, "model_fields", {}):
+                draft_cls = schema.model_fields["draft"].annotation
+                return schema(draft=self.generate_structured(prompt, draft_cls), critique="PASS")
+
             # 1. QueryPlan (Stage 1)
             if schema_name == "QueryPlan":
                 return schema(
@@ -253,7 +505,12 @@ class MockGeminiClient:
 # --------------------------------------------------------------------------
 # Factory Function
 # --------------------------------------------------------------------------
+@functools.cache
 def get_default_client():
+    """
+    Process-wide client: built once (SDK setup, model handle) and shared by
+    every stage and every run of a session.
+    """
     api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
     if api_key:
         return RealGeminiClient(api_key)
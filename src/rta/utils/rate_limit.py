@@ -0,0 +1,51 @@
+"""
+Client-side request pacing.
+File: src/rta/utils/rate_limit.py
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: up to `capacity` requests may go out at once,
+    then one per 1/rate seconds. acquire() blocks only when the bucket is empty.
+
+    The rate adapts (AIMD): a rate-limit error halves it, every success adds
+    a tenth of the configured rate back, never above the configured rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = 0.02):
+        self.max_rate = max(rate, min_rate)
+        self.rate = self.max_rate
+        self.min_rate = min_rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_rate_limited(self) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
@@ -5,7 +5,7 @@ File: src/rta/utils/ui.py
 """
 
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Generator, Optional
 import logging
 
 try:
@@ -18,6 +18,13 @@ except ImportError:
     HAS_RICH = False
     console = None
 
+# Animate only on a real terminal: in CI / redirected output a spinner is
+# just escape sequences and a refresh thread
+_IS_TTY = bool(HAS_RICH and console and console.is_terminal)
+
+# The one status line on screen; nested spinners reuse it
+_active_status: Optional[Any] = None
+
 @contextmanager
 def spinner(text: str = "Processing...") -> Generator[None, None, None]:
     """
@@ -27,10 +34,24 @@ def spinner(text: str = "Processing...") -> Generator[None, None, None]:
         with spinner("Searching..."):
             do_heavy_work()
     """
-    if HAS_RICH and console:
-        # 'dots' is the classic spinner. 'aesthetic' or 'earth' are also cool options.
-        with console.status(f"[bold green]{text}", spinner="dots"):
+    global _active_status
+    message = f"[bold green]{text}"
+    if _IS_TTY and _active_status is not None:
+        # nested: retitle the running spinner, restore the outer text after
+        outer = _active_status.status
+        _active_status.update(message)
+        try:
             yield
+        finally:
+            _active_status.update(outer)
+    elif _IS_TTY:
+        # 'dots' is the classic spinner. 'aesthetic' or 'earth' are also cool options.
+        with console.status(message, spinner="dots") as status:
+            _active_status = status
+            try:
+                yield
+            finally:
+                _active_status = None
     else:
         # Fallback for environments without rich or dumb terminals
         logging.info(f"[*] {text}")
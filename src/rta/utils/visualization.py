@@ -3,6 +3,10 @@ Visualization Utilities.
 File: src/rta/utils/visualization.py
 """
 
+# Mermaid labels are quoted: strip the quotes in one pass per string
+_STRIP_QUOTES = str.maketrans('', '', '"\'')
+_STRIP_DOUBLE_QUOTES = str.maketrans('', '', '"')
+
 def generate_reasoning_graph(result, output_format: str = "mermaid") -> str:
     """
     Generates a Mermaid JS graph definition from the reasoning result.
@@ -13,7 +17,7 @@ def generate_reasoning_graph(result, output_format: str = "mermaid") -> str:
     # Use getattr to safely retrieve the topic or default to "Research Topic"
     topic = getattr(result, 'topic', "Research Topic")
     # Sanitize string to prevent syntax errors in Mermaid
-    safe_topic = topic.replace('"', '').replace("'", "")
+    safe_topic = topic.translate(_STRIP_QUOTES)
     lines.append(f"    Root([\"{safe_topic}\"])")
     
     # Styles
@@ -26,11 +30,13 @@ def generate_reasoning_graph(result, output_format: str = "mermaid") -> str:
     for i, cluster in enumerate(clusters):
         # [FIXED] Changed 'topic_name' to 'name' to match the schema
         raw_name = getattr(cluster, 'name', getattr(cluster, 'topic_name', f"Cluster_{i}"))
-        safe_cluster_name = raw_name.replace('"', '')
+        safe_cluster_name = raw_name.translate(_STRIP_DOUBLE_QUOTES)
         
         cluster_node_id = f"C{i}"
-        lines.append(f"    Root --> {cluster_node_id}[\"{safe_cluster_name}\"]")
-        lines.append(f"    class {cluster_node_id} cluster")
+        lines.extend((
+            f"    Root --> {cluster_node_id}[\"{safe_cluster_name}\"]",
+            f"    class {cluster_node_id} cluster",
+        ))
         
         # Iterate through findings (if available)
         findings = getattr(cluster, 'key_findings', [])
@@ -38,10 +44,12 @@ def generate_reasoning_graph(result, output_format: str = "mermaid") -> str:
             summary = getattr(finding, 'summary', 'Finding')
             # Truncate long summaries for visual clarity
             short_summary = (summary[:40] + "...") if len(summary) > 40 else summary
-            safe_summary = short_summary.replace('"', '')
+            safe_summary = short_summary.translate(_STRIP_DOUBLE_QUOTES)
             
             finding_node_id = f"F{i}_{j}"
-            lines.append(f"    {cluster_node_id} --> {finding_node_id}(\"{safe_summary}\")")
-            lines.append(f"    class {finding_node_id} finding")
+            lines.extend((
+                f"    {cluster_node_id} --> {finding_node_id}(\"{safe_summary}\")",
+                f"    class {finding_node_id} finding",
+            ))
 
     return "\n".join(lines)
\ No newline at end of file
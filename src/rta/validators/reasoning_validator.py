@@ -1,8 +1,18 @@
 from __future__ import annotations
 
-from typing import Set
+from typing import Iterable, List, Set
 from ..schemas.reasoning import ReasoningResult
 
+# offenders listed per category in the error message
+_MAX_REPORTED = 10
+
+
+def _describe(kind: str, unknown: Iterable[str]) -> str:
+    ids = sorted(unknown)
+    shown = ", ".join(ids[:_MAX_REPORTED])
+    more = f" (+{len(ids) - _MAX_REPORTED} more)" if len(ids) > _MAX_REPORTED else ""
+    return f"{kind}: {shown}{more}"
+
 
 def validate_reasoning(result: ReasoningResult, valid_paper_ids: Set[str]) -> None:
     """
@@ -10,23 +20,29 @@ def validate_reasoning(result: ReasoningResult, valid_paper_ids: Set[str]) -> No
     - every supporting_papers/evidence paper_id must exist in retrieved set
     - research_gaps supporting_papers must exist
     - related_clusters must refer to existing cluster_ids
+
+    Every unknown id is reported in a single ValueError.
     """
     cluster_ids = {c.cluster_id for c in result.clusters}
 
-    # claims
-    for cl in result.claims:
-        for pid in cl.supporting_papers:
-            if pid not in valid_paper_ids:
-                raise ValueError(f"ReasoningClaim {cl.claim_id} references unknown paper_id: {pid}")
-        for ev in cl.evidence:
-            if ev.paper_id not in valid_paper_ids:
-                raise ValueError(f"Evidence references unknown paper_id: {ev.paper_id}")
-
-    # gaps
-    for g in result.research_gaps:
-        for pid in g.supporting_papers:
-            if pid not in valid_paper_ids:
-                raise ValueError(f"ResearchGap {g.gap_id} references unknown paper_id: {pid}")
-        for cid in g.related_clusters:
-            if cid not in cluster_ids:
-                raise ValueError(f"ResearchGap {g.gap_id} references unknown cluster_id: {cid}")
+    claim_pids = {pid for cl in result.claims for pid in cl.supporting_papers}
+    evidence_pids = {ev.paper_id for cl in result.claims for ev in cl.evidence}
+    gap_pids = {pid for g in result.research_gaps for pid in g.supporting_papers}
+    gap_cids = {cid for g in result.research_gaps for cid in g.related_clusters}
+
+    # the usual case: everything resolves, no per-id work
+    if (valid_paper_ids.issuperset(claim_pids) and valid_paper_ids.issuperset(evidence_pids)
+            and valid_paper_ids.issuperset(gap_pids) and cluster_ids.issuperset(gap_cids)):
+        return
+
+    problems: List[str] = []
+    for kind, ids, known in (
+        ("ReasoningClaim references unknown paper_id", claim_pids, valid_paper_ids),
+        ("Evidence references unknown paper_id", evidence_pids, valid_paper_ids),
+        ("ResearchGap references unknown paper_id", gap_pids, valid_paper_ids),
+        ("ResearchGap references unknown cluster_id", gap_cids, cluster_ids),
+    ):
+        unknown = ids - known
+        if unknown:
+            problems.append(_describe(kind, unknown))
+    raise ValueError("; ".join(problems))
@@ -97,7 +97,7 @@ class MockLLMClient:
         self.call_count = 0
 
     def get_embedding(self, text: str) -> np.ndarray:
-        return np.random.rand(768)
+        return np.random.default_rng(len(text)).random(768)
 
     def generate_text(self, prompt: str) -> str:
         if "research sub-field name" in prompt or "naming task" in prompt: